@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+import time
+
+import fitz
+
+import pdf_extraction
+from synthetic_pdfs import make_synthetic_pdf
+
+
+def fmt(t):
+    return f"{t*1000:.1f} ms"
+
+
+def time_parse(path, flags, repeats=3):
+    """Best-of-N time to parse every page of path into line records with the given get_text flags."""
+    best = None
+    lines = None
+    for _ in range(repeats):
+        doc = fitz.open(path)
+        s = time.perf_counter()
+        lines, _ = pdf_extraction._collect_pages(doc, range(len(doc)), flags)
+        e = time.perf_counter()
+        doc.close()
+        best = e - s if best is None else min(best, e - s)
+    return best, lines
+
+
+if __name__ == '__main__':
+    # Compare page parsing with the full "dict" output (images included) against text-only blocks
+    paths = sys.argv[1:]
+    tmp_dir = None
+    if not paths:
+        tmp_dir = tempfile.mkdtemp()
+        synthetic = os.path.join(tmp_dir, 'image_heavy.pdf')
+        make_synthetic_pdf(synthetic, pages=40, images_per_page=4)
+        paths = [synthetic]
+
+    for path in paths:
+        print('Benchmarking page parsing for:', path)
+        full_t, full_lines = time_parse(path, pdf_extraction.FULL_DICT_FLAGS)
+        text_t, text_lines = time_parse(path, pdf_extraction.TEXT_ONLY_FLAGS)
+        print('  dict with images:', fmt(full_t))
+        print('  text-only blocks:', fmt(text_t))
+        print(f'  speedup: {full_t / text_t:.2f}x, identical lines: {full_lines == text_lines}')
+
+    if tmp_dir:
+        os.remove(synthetic)
+        os.rmdir(tmp_dir)
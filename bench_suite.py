@@ -0,0 +1,202 @@
+# Offline benchmark suite over a generated PDF corpus.
+# Generates synthetic PDFs (see synthetic_pdfs.py), times every pipeline stage with warmup
+# runs and repeats, and writes the results as JSON so runs can be compared to catch
+# regressions: `python bench_suite.py --pages 20 200 --repeats 5 --output bench.json`
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import instrumentation
+import memory_profile
+import pdf_extraction
+from synthetic_pdfs import make_synthetic_pdf
+
+# name -> make_synthetic_pdf options; the page count is added per run
+CORPUS_VARIANTS = {
+    "text": {},
+    "two_column": {"columns": 2},
+    "image_heavy": {"images_per_page": 3},
+    "dense_headings": {"headings_per_page": 5, "paragraphs_per_section": 1},
+}
+
+
+def time_stage(fn, warmup, repeats):
+    """Run fn warmup times untimed, then repeats times; return (timings in seconds, last result)."""
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    timings = []
+    for _ in range(repeats):
+        s = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - s)
+    return timings, result
+
+
+def _profiled_stage(corpus, stage, fn, warmup, repeats):
+    # One memory record per stage and document, covering the warmup and timed runs
+    with memory_profile.stage(stage, corpus):
+        return time_stage(fn, warmup, repeats)
+
+
+def _record(results, corpus, stage, timings, **extra):
+    entry = {"corpus": corpus, "stage": stage, "times_s": timings, "min_s": min(timings),
+             "median_s": statistics.median(timings), "mean_s": statistics.fmean(timings)}
+    entry.update(extra)
+    results.append(entry)
+    print(f"{corpus:>24} {stage:<28} median {entry['median_s'] * 1000:9.1f} ms", file=sys.stderr)
+
+
+def _reason(e):
+    # NLTK and transformers errors are multi-line banners; keep the first informative line
+    lines = [ln.strip() for ln in str(e).splitlines() if ln.strip().strip('*')]
+    return f"{type(e).__name__}: {lines[0] if lines else ''}"
+
+
+def _skip(results, corpus, stage, reason):
+    results.append({"corpus": corpus, "stage": stage, "skipped": reason})
+    print(f"{corpus:>24} {stage:<28} skipped: {reason}", file=sys.stderr)
+
+
+def _bench_paraphrase(results, corpus, chunks, batch_sizes, n_chunks, warmup, repeats, chunk_source):
+    try:
+        from config import get_model_tokenizer_device, get_model_name
+        from paraphrasing import paraphrase_chunks
+        get_model_tokenizer_device()
+    except Exception as e:
+        for batch_size in batch_sizes:
+            _skip(results, corpus, f"paraphrase_chunks[bs={batch_size}]", f"model unavailable: {_reason(e)}")
+        return
+    sample = chunks[:n_chunks]
+    if not sample:
+        _skip(results, corpus, "paraphrase_chunks", "no chunks")
+        return
+    for batch_size in batch_sizes:
+        # Greedy, uncached and without dedupe, so every repeat does the same generation work
+        stage = f"paraphrase_chunks[bs={batch_size}]"
+        timings, _ = _profiled_stage(corpus, stage,
+                                     lambda: paraphrase_chunks(sample, batch_size=batch_size, num_beams=1, max_length=64,
+                                                               do_sample=False, cache=None, dedupe=None),
+                                     warmup, repeats)
+        _record(results, corpus, stage, timings, chunks=len(sample), chunk_source=chunk_source,
+                model=get_model_name())
+
+
+def run_suite(page_counts, variants, repeats, warmup, batch_sizes, paraphrase_sample, paraphrase, work_dir, seed=0):
+    results = []
+    corpus = []
+    for pages in page_counts:
+        for variant in variants:
+            options = dict(CORPUS_VARIANTS[variant], pages=pages, seed=seed)
+            name = f"{variant}_{pages}p"
+            path = make_synthetic_pdf(os.path.join(work_dir, name + ".pdf"), **options)
+            corpus.append({"name": name, "options": options, "bytes": os.path.getsize(path)})
+
+            timings, text = _profiled_stage(name, "extract_topics_from_pdf",
+                                            lambda: pdf_extraction.extract_topics_from_pdf(path),
+                                            warmup, repeats)
+            _record(results, name, "extract_topics_from_pdf", timings, pages=pages)
+            # Only the streaming extractor still samples pages for its font statistics
+            timings, _ = _profiled_stage(name, "iter_topics_from_pdf[full]",
+                                         lambda: list(pdf_extraction.iter_topics_from_pdf(path, fast=False)),
+                                         warmup, repeats)
+            _record(results, name, "iter_topics_from_pdf[full]", timings, pages=pages)
+            timings, _ = _profiled_stage(name, "iter_topics_from_pdf[fast]",
+                                         lambda: list(pdf_extraction.iter_topics_from_pdf(path, fast=True, sample_pages=3)),
+                                         warmup, repeats)
+            _record(results, name, "iter_topics_from_pdf[fast]", timings, pages=pages)
+            timings, sections = _profiled_stage(name, "extract_sections_from_pdf",
+                                                lambda: pdf_extraction.extract_sections_from_pdf(path),
+                                                warmup, repeats)
+            _record(results, name, "extract_sections_from_pdf", timings, pages=pages, sections=len(sections))
+
+            try:
+                from text_processing import split_into_topics
+                timings, topics = _profiled_stage(name, "split_into_topics", lambda: split_into_topics(text),
+                                                  warmup, repeats)
+                chunks = [c for topic_chunks in topics.values() for c in topic_chunks]
+                chunk_source = "split_into_topics"
+                _record(results, name, "split_into_topics", timings, topics=len(topics), chunks=len(chunks))
+            except Exception as e:
+                # Usually NLTK sentence data missing offline; extracted paragraphs still make realistic chunks
+                _skip(results, name, "split_into_topics", _reason(e))
+                chunks = [text for section in sections for text, _is_bullet in section.paragraphs]
+                chunk_source = "paragraphs"
+
+            if paraphrase:
+                _bench_paraphrase(results, name, chunks, batch_sizes, paraphrase_sample, warmup, repeats,
+                                  chunk_source)
+    return corpus, results
+
+
+def _environment():
+    env = {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+           "cpu_count": os.cpu_count(), "pymupdf": getattr(pdf_extraction.fitz, "VersionBind", None)}
+    for module in ("torch", "transformers"):
+        if module in sys.modules:
+            env[module] = getattr(sys.modules[module], "__version__", None)
+    return env
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline on generated PDFs and write JSON results.')
+    parser.add_argument('--pages', type=int, nargs='+', default=[20, 100], help='Page counts of the generated PDFs')
+    parser.add_argument('--variants', nargs='+', choices=sorted(CORPUS_VARIANTS), default=sorted(CORPUS_VARIANTS),
+                        help='Corpus layouts to generate')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed runs per stage')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per stage before timing')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 16], help='paraphrase_chunks batch sizes')
+    parser.add_argument('--paraphrase-sample', type=int, default=32, help='Chunks paraphrased per corpus document')
+    parser.add_argument('--tiny-model', action='store_true', help='Benchmark paraphrasing with a small randomly initialised T5 (no download)')
+    parser.add_argument('--no-paraphrase', action='store_true', help='Skip the model stages')
+    parser.add_argument('--profile-memory', action='store_true', help='Add per-stage peak RSS, tracemalloc peaks and top allocation sites to the report (timings then include tracemalloc overhead)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated text')
+    parser.add_argument('--keep-pdfs', default=None, help='Write the generated PDFs to this directory and keep them')
+    parser.add_argument('--output', default=None, help='Write JSON results here instead of stdout')
+    args = parser.parse_args()
+
+    if args.tiny_model:
+        from config import configure
+        configure(tiny_model=True)
+    if args.profile_memory:
+        if not args.no_paraphrase:
+            # Import the model stack first so its import-time allocations are not traced
+            try:
+                import paraphrasing  # noqa: F401
+            except Exception:
+                pass
+        memory_profile.start()
+
+    started = time.time()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.keep_pdfs or tmp_dir
+        os.makedirs(work_dir, exist_ok=True)
+        corpus, results = run_suite(args.pages, args.variants, args.repeats, args.warmup, args.batch_sizes,
+                                    args.paraphrase_sample, not args.no_paraphrase, work_dir, seed=args.seed)
+
+    report = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "duration_s": time.time() - started,
+        "environment": _environment(),
+        "settings": vars(args),
+        "corpus": corpus,
+        "results": results,
+        # Totals over the whole run, including the warmup passes
+        "instrumentation": instrumentation.snapshot(),
+    }
+    if args.profile_memory:
+        report["memory"] = memory_profile.report()
+        print(memory_profile.format_report(), file=sys.stderr)
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(out + '\n')
+        print('Results written to', args.output, file=sys.stderr)
+    else:
+        print(out)
@@ -0,0 +1,289 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+# Extraction results are small compared to the PDFs, so a few hundred MB covers many documents
+_DEFAULT_EXTRACTION_CACHE_BYTES = 256 * 1024 * 1024
+_DEFAULT_PARAPHRASE_CACHE_BYTES = 128 * 1024 * 1024
+_DEFAULT_PARAPHRASE_MEMORY_ITEMS = 50000
+_HASH_CHUNK_SIZE = 1024 * 1024
+# Stay well below SQLite's bound-parameter limit in IN (...) queries
+_SQL_BATCH = 500
+
+_EXTRACTION_CACHE = None
+_PARAPHRASE_CACHE = None
+_LOCK = threading.Lock()
+
+
+def default_cache_dir():
+    """Directory for on-disk caches; override with NOTES_SUMMARIZER_CACHE_DIR."""
+    path = os.environ.get("NOTES_SUMMARIZER_CACHE_DIR")
+    if not path:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        path = os.path.join(base, "notes_summarizer")
+    return path
+
+
+def file_digest(path):
+    """sha256 of a file's content, read in chunks so large PDFs are not loaded at once."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def make_key(*parts, **params):
+    """Build a stable cache key from positional parts and keyword parameters."""
+    payload = json.dumps([parts, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskLRUCache:
+    """SQLite-backed key/value store with size-bounded LRU eviction.
+
+    Values are pickled and zlib-compressed. Safe to share between processes:
+    every operation uses its own short-lived connection and SQLite does the locking.
+    """
+
+    def __init__(self, path, max_bytes=_DEFAULT_EXTRACTION_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key, default=None):
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return default
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        finally:
+            conn.close()
+        try:
+            return pickle.loads(zlib.decompress(row[0]))
+        except Exception:
+            # Corrupt or incompatible entry (e.g. a class changed shape): treat as a miss
+            self.delete(key)
+            return default
+
+    def get_many(self, keys):
+        """Return {key: value} for the keys that are present, in a few round-trips."""
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        conn = self._connect()
+        try:
+            with conn:
+                for i in range(0, len(keys), _SQL_BATCH):
+                    part = keys[i:i + _SQL_BATCH]
+                    marks = ",".join("?" * len(part))
+                    rows = conn.execute(f"SELECT key, value FROM entries WHERE key IN ({marks})", part).fetchall()
+                    if rows:
+                        now = time.time()
+                        conn.executemany("UPDATE entries SET last_access = ? WHERE key = ?", [(now, k) for k, _ in rows])
+                    for k, blob in rows:
+                        try:
+                            found[k] = pickle.loads(zlib.decompress(blob))
+                        except Exception:
+                            pass
+        finally:
+            conn.close()
+        return found
+
+    def set_many(self, items):
+        rows = []
+        now = time.time()
+        for key, value in items:
+            blob = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            if len(blob) <= self.max_bytes:
+                rows.append((key, blob, len(blob), now))
+        if not rows:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)", rows)
+                self._evict(conn)
+        finally:
+            conn.close()
+
+    def set(self, key, value):
+        blob = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if len(blob) > self.max_bytes:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, blob, len(blob), time.time()),
+                )
+                self._evict(conn)
+        finally:
+            conn.close()
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access ASC"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+    def delete(self, key):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        finally:
+            conn.close()
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM entries")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+    def __len__(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        finally:
+            conn.close()
+
+
+def get_extraction_cache():
+    """Return the process-wide extraction cache, creating it on first use."""
+    global _EXTRACTION_CACHE
+    if _EXTRACTION_CACHE is None:
+        with _LOCK:
+            if _EXTRACTION_CACHE is None:
+                path = os.path.join(default_cache_dir(), "extraction.sqlite")
+                _EXTRACTION_CACHE = DiskLRUCache(path, max_bytes=_DEFAULT_EXTRACTION_CACHE_BYTES)
+    return _EXTRACTION_CACHE
+
+
+class MemoryLRUCache:
+    """Thread-safe in-process LRU mapping bounded by item count."""
+
+    def __init__(self, max_items=_DEFAULT_PARAPHRASE_MEMORY_ITEMS):
+        self.max_items = max_items
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ParaphraseCache:
+    """Memoises paraphrase outputs per chunk.
+
+    Lookups go to an in-process LRU first and then to an optional DiskLRUCache, so
+    results survive across runs. Keys cover the model name, the chunk text and every
+    generation setting that changes the output.
+    """
+
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory if memory is not None else MemoryLRUCache()
+        self.disk = disk
+
+    @staticmethod
+    def key(model_name, chunk, num_beams, max_length, do_sample, seed):
+        return make_key("paraphrase", model_name, chunk, num_beams=num_beams, max_length=max_length,
+                        do_sample=do_sample, seed=seed)
+
+    def get_many(self, keys):
+        """Return {key: paraphrase} for every key found in memory or on disk."""
+        found = {}
+        missing = []
+        for k in keys:
+            v = self.memory.get(k)
+            if v is None:
+                missing.append(k)
+            else:
+                found[k] = v
+        if missing and self.disk is not None:
+            for k, v in self.disk.get_many(missing).items():
+                # promote disk hits so repeated lookups in this process stay in memory
+                self.memory.set(k, v)
+                found[k] = v
+        return found
+
+    def set_many(self, items):
+        items = list(items)
+        for k, v in items:
+            self.memory.set(k, v)
+        if self.disk is not None:
+            self.disk.set_many(items)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+def get_paraphrase_cache(persistent=True):
+    """Return the process-wide paraphrase cache, creating it on first use.
+
+    persistent only matters on the first call: it decides whether an on-disk store
+    backs the in-process LRU.
+    """
+    global _PARAPHRASE_CACHE
+    if _PARAPHRASE_CACHE is None:
+        with _LOCK:
+            if _PARAPHRASE_CACHE is None:
+                disk = None
+                if persistent:
+                    path = os.path.join(default_cache_dir(), "paraphrase.sqlite")
+                    disk = DiskLRUCache(path, max_bytes=_DEFAULT_PARAPHRASE_CACHE_BYTES)
+                _PARAPHRASE_CACHE = ParaphraseCache(disk=disk)
+    return _PARAPHRASE_CACHE
@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import threading
+
+from cache import default_cache_dir, file_digest, make_key
+
+_JOBS_SUBDIR = "jobs"
+_MANIFEST = "manifest.json"
+_TOPICS = "topics.jsonl"
+
+
+def jobs_dir():
+    """Directory holding one checkpoint directory per batch job."""
+    return os.path.join(default_cache_dir(), _JOBS_SUBDIR)
+
+
+def job_id_for(pdfs, **options):
+    """Stable id of a batch job: the same PDFs with the same output-affecting options resume the same job."""
+    paths = sorted(os.path.abspath(p) for p in pdfs)
+    return make_key("job", paths, **options)[:16]
+
+
+def clear_jobs():
+    shutil.rmtree(jobs_dir(), ignore_errors=True)
+
+
+class JobCheckpoint:
+    """Progress of one batch job, kept on disk so an interrupted run can be resumed.
+
+    manifest.json lists finished documents (with the content hash of the PDF and the
+    summary that was written); it is replaced atomically. topics.jsonl gets one line per
+    paraphrased topic, appended and flushed as soon as the topic is done, so a killed
+    process loses at most the topics that were being generated. A topic is only reused
+    when its chunks are unchanged.
+    """
+
+    def __init__(self, job_id, root=None):
+        self.job_id = job_id
+        self.path = os.path.join(root or jobs_dir(), job_id)
+        os.makedirs(self.path, exist_ok=True)
+        self._manifest_path = os.path.join(self.path, _MANIFEST)
+        self._topics_path = os.path.join(self.path, _TOPICS)
+        self._lock = threading.Lock()
+        self._documents = self._load_manifest()
+        self._topics = self._load_topics()
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("documents", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _load_topics(self):
+        topics = {}
+        try:
+            with open(self._topics_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash; everything before it is intact
+                        continue
+                    topics[(entry["pdf"], entry["topic"], entry["chunks"])] = entry["bullets"]
+        except OSError:
+            pass
+        return topics
+
+    def _write_manifest(self):
+        tmp_path = self._manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"job_id": self.job_id, "documents": self._documents}, f, indent=1)
+        os.replace(tmp_path, self._manifest_path)
+
+    def document_done(self, pdf_path):
+        """True when pdf_path was finished by this job, is unchanged and its summary still exists."""
+        with self._lock:
+            entry = self._documents.get(os.path.abspath(pdf_path))
+        if not entry or not os.path.exists(entry["output"]):
+            return False
+        try:
+            return entry["digest"] == file_digest(pdf_path)
+        except OSError:
+            return False
+
+    def mark_document_done(self, pdf_path, output_path):
+        digest = file_digest(pdf_path)
+        with self._lock:
+            self._documents[os.path.abspath(pdf_path)] = {"digest": digest, "output": os.path.abspath(output_path)}
+            self._write_manifest()
+
+    def topic_bullets(self, pdf_path, topic, chunks):
+        """Bullets saved for this topic by an earlier run, or None."""
+        with self._lock:
+            return self._topics.get((os.path.abspath(pdf_path), topic, make_key(*chunks)))
+
+    def save_topic(self, pdf_path, topic, chunks, bullets):
+        key = (os.path.abspath(pdf_path), topic, make_key(*chunks))
+        line = json.dumps({"pdf": key[0], "topic": topic, "chunks": key[2], "bullets": bullets})
+        with self._lock:
+            self._topics[key] = bullets
+            with open(self._topics_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
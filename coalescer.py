@@ -0,0 +1,147 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# How long the worker waits for more requests after the first one arrives
+_DEFAULT_WINDOW_S = 0.01
+# Stop collecting once this many chunks are waiting, even inside the window
+_DEFAULT_MAX_CHUNKS = 256
+
+_COALESCER = None
+_LOCK = threading.Lock()
+
+
+class RequestCoalescer:
+    """Merges concurrent paraphrase requests into shared batches on one worker thread.
+
+    submit() returns a concurrent.futures.Future right away. The worker takes the
+    first waiting request, keeps collecting for `window` seconds (or until
+    `max_chunks` chunks are waiting), groups the requests by generation options and
+    runs one paraphrase call per group, so that callers with few chunks each still
+    fill a batch. Each caller's future resolves to its own paraphrases, in order.
+    """
+
+    def __init__(self, paraphrase_fn=None, window=_DEFAULT_WINDOW_S, max_chunks=_DEFAULT_MAX_CHUNKS, **default_options):
+        self._paraphrase_fn = paraphrase_fn
+        self.window = window
+        self.max_chunks = max_chunks
+        self.default_options = default_options
+        self._queue = queue.Queue()
+        # Chunks waiting in the queue, and the (requests, chunks) the worker is collecting into a batch
+        self._backlog_lock = threading.Lock()
+        self._queued_chunks = 0
+        self._collecting = (0, 0)
+        self._thread = threading.Thread(target=self._run, name='paraphrase-coalescer', daemon=True)
+        self._thread.start()
+
+    def submit(self, chunks, **options):
+        """Queue chunks for paraphrasing and return a Future for the list of paraphrases."""
+        fut = Future()
+        if not chunks:
+            fut.set_result([])
+            return fut
+        merged = dict(self.default_options)
+        merged.update(options)
+        chunks = list(chunks)
+        with self._backlog_lock:
+            self._queued_chunks += len(chunks)
+        self._queue.put((chunks, merged, fut))
+        return fut
+
+    def backlog(self):
+        """(requests, chunks) submitted but not yet handed to the model: queued plus being collected."""
+        with self._backlog_lock:
+            requests, chunks = self._collecting
+            return self._queue.qsize() + requests, self._queued_chunks + chunks
+
+    def paraphrase(self, chunks, timeout=None, **options):
+        """Blocking helper: submit() and wait for the result."""
+        return self.submit(chunks, **options).result(timeout)
+
+    def _paraphrase(self, chunks, **options):
+        if self._paraphrase_fn is None:
+            # Imported lazily so constructing a coalescer does not pull in torch
+            from paraphrasing import paraphrase_chunks
+            self._paraphrase_fn = paraphrase_chunks
+        return self._paraphrase_fn(chunks, **options)
+
+    def _take(self, request):
+        with self._backlog_lock:
+            self._queued_chunks -= len(request[0])
+            requests, chunks = self._collecting
+            self._collecting = (requests + 1, chunks + len(request[0]))
+        return request
+
+    def _collect(self):
+        requests = [self._take(self._queue.get())]
+        waiting = len(requests[0][0])
+        deadline = time.monotonic() + self.window
+        while waiting < self.max_chunks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            requests.append(self._take(request))
+            waiting += len(request[0])
+        with self._backlog_lock:
+            self._collecting = (0, 0)
+        return requests
+
+    def _run(self):
+        # Every failure is routed to the affected futures: if this loop exited, later callers would wait forever
+        while True:
+            groups = {}
+            for chunks, options, fut in self._collect():
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                try:
+                    key = tuple(sorted(options.items(), key=lambda kv: kv[0]))
+                    groups.setdefault(key, (options, []))[1].append((chunks, fut))
+                except Exception as e:
+                    # e.g. an unhashable option value
+                    fut.set_exception(e)
+            for options, members in groups.values():
+                try:
+                    flat = [c for chunks, _ in members for c in chunks]
+                    paraphrased = self._paraphrase(flat, **options)
+                    idx = 0
+                    for chunks, fut in members:
+                        fut.set_result(paraphrased[idx:idx + len(chunks)])
+                        idx += len(chunks)
+                except Exception as e:
+                    for _, fut in members:
+                        if not fut.done():
+                            fut.set_exception(e)
+
+
+def get_coalescer():
+    """Return the process-wide coalescer (one inference worker thread), creating it on first use."""
+    global _COALESCER
+    if _COALESCER is None:
+        with _LOCK:
+            if _COALESCER is None:
+                _COALESCER = RequestCoalescer()
+    return _COALESCER
+
+
+def get_backlog():
+    """backlog() of the process-wide coalescer, or (0, 0) before it exists."""
+    coalescer = _COALESCER
+    return coalescer.backlog() if coalescer is not None else (0, 0)
+
+
+async def paraphrase_async(chunks, coalescer=None, **options):
+    """Awaitable paraphrase_chunks.
+
+    Chunks from concurrent callers are merged into shared batches by the coalescer's
+    single worker thread, so the event loop is never blocked by generation and many
+    uploads can be served at near full batch efficiency. options are passed through
+    to paraphrase_chunks.
+    """
+    coalescer = coalescer or get_coalescer()
+    return await asyncio.wrap_future(coalescer.submit(chunks, **options))
@@ -1,6 +1,8 @@
+import os
 import torch
 from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
 import threading
+import instrumentation
 
 # Lazy-loaded model/tokenizer to avoid expensive import-time work
 _MODEL = None
@@ -8,28 +10,106 @@ _TOKENIZER = None
 _DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 _MODEL_NAME = "Vamsi/T5_Paraphrase_Paws"
 _LOCK = threading.Lock()
+# Options that change how the model is loaded; set through configure() before first use
+_QUANTIZE_INT8 = False
+_BACKEND = "torch"
+BACKENDS = ("torch", "onnx")
+# Offline stand-in: NOTES_SUMMARIZER_TINY_MODEL=1 lets scripts without flags (bench_time.py, the UI) use it
+_TINY_MODEL = os.environ.get("NOTES_SUMMARIZER_TINY_MODEL") == "1"
+TINY_MODEL_NAME = "tiny-random-t5"
+
+def configure(quantize_int8=None, backend=None, tiny_model=None):
+	"""Set model loading options. Must be called before the model is first loaded.
+
+	quantize_int8: run on CPU with dynamic int8 quantization of the Linear layers
+	(roughly half the memory of fp32 and faster generate() on CPU-only machines).
+	backend: "torch" (default) or "onnx" to run generation with ONNX Runtime on CPU.
+	tiny_model: build a small randomly initialised T5 locally instead of downloading
+	the paraphrase model (see tiny_model.py); for offline benchmarks and tests.
+	"""
+	global _QUANTIZE_INT8, _BACKEND, _DEVICE, _TINY_MODEL
+	with _LOCK:
+		if _MODEL is not None:
+			raise RuntimeError("configure() must be called before the paraphrase model is loaded")
+		if quantize_int8 is not None:
+			_QUANTIZE_INT8 = bool(quantize_int8)
+		if backend is not None:
+			if backend not in BACKENDS:
+				raise ValueError(f"Unknown backend {backend!r}; expected one of {BACKENDS}")
+			_BACKEND = backend
+		if tiny_model is not None:
+			_TINY_MODEL = bool(tiny_model)
+		if _QUANTIZE_INT8 and _BACKEND != "torch":
+			raise ValueError("int8 quantization is only available with the torch backend")
+		if _TINY_MODEL and _BACKEND != "torch":
+			raise ValueError("The tiny offline model is only available with the torch backend")
+		# Dynamic quantization and the ONNX backend only run on CPU
+		if _QUANTIZE_INT8 or _BACKEND == "onnx":
+			_DEVICE = torch.device("cpu")
+		else:
+			_DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+def load_tokenizer(tiny_model=False):
+	if tiny_model:
+		from tiny_model import load_tiny_tokenizer
+		return load_tiny_tokenizer(_MODEL_NAME)
+	return AutoTokenizer.from_pretrained(_MODEL_NAME)
+
+def load_model(device, use_fp16_on_cuda=True, quantize_int8=False, backend="torch", tiny_model=False, tokenizer=None):
+	"""Build a new model instance on device in eval mode (uncached; see get_model_tokenizer_device).
+
+	tiny_model needs the tokenizer the model will be used with, to size its vocabulary.
+	"""
+	if tiny_model:
+		from tiny_model import build_tiny_model
+		model = build_tiny_model(tokenizer)
+		if quantize_int8:
+			return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+		return model.to(device)
+	if backend == "onnx":
+		from onnx_backend import load_onnx_model
+		return load_onnx_model(_MODEL_NAME)
+	if quantize_int8:
+		model = AutoModelForSeq2SeqLM.from_pretrained(_MODEL_NAME)
+		model.eval()
+		return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+	if use_fp16_on_cuda and device.type == "cuda":
+		model = AutoModelForSeq2SeqLM.from_pretrained(_MODEL_NAME, torch_dtype=torch.float16)
+	else:
+		model = AutoModelForSeq2SeqLM.from_pretrained(_MODEL_NAME)
+	model = model.to(device)
+	model.eval()
+	return model
 
 def get_model_tokenizer_device(use_fp16_on_cuda=True):
 	"""Return (model, tokenizer, device) and load them on first call. Thread-safe."""
 	global _MODEL, _TOKENIZER, _DEVICE
-	
+
 	# Fast path: if already loaded, return immediately
 	if _MODEL is not None and _TOKENIZER is not None:
 		return _MODEL, _TOKENIZER, _DEVICE
-	
+
 	# Slow path: load with lock
 	with _LOCK:
 		# Double-check after acquiring lock
-		if _TOKENIZER is None:
-			_TOKENIZER = AutoTokenizer.from_pretrained(_MODEL_NAME)
 		if _MODEL is None:
-			if use_fp16_on_cuda and torch.cuda.is_available():
-				_MODEL = AutoModelForSeq2SeqLM.from_pretrained(_MODEL_NAME, torch_dtype=torch.float16)
-			else:
-				_MODEL = AutoModelForSeq2SeqLM.from_pretrained(_MODEL_NAME)
-			_MODEL = _MODEL.to(_DEVICE)
-			_MODEL.eval()
+			with instrumentation.timed(instrumentation.MODEL_LOAD):
+				if _TOKENIZER is None:
+					_TOKENIZER = load_tokenizer(_TINY_MODEL)
+				_MODEL = load_model(_DEVICE, use_fp16_on_cuda=use_fp16_on_cuda, quantize_int8=_QUANTIZE_INT8, backend=_BACKEND,
+					tiny_model=_TINY_MODEL, tokenizer=_TOKENIZER)
+		elif _TOKENIZER is None:
+			_TOKENIZER = load_tokenizer(_TINY_MODEL)
 	return _MODEL, _TOKENIZER, _DEVICE
 
 def get_device():
-	return _DEVICE
\ No newline at end of file
+	return _DEVICE
+
+def get_model_name():
+	"""Identifier of the paraphrase model; part of every paraphrase cache key."""
+	name = TINY_MODEL_NAME if _TINY_MODEL else _MODEL_NAME
+	if _QUANTIZE_INT8:
+		name += "+int8"
+	if _BACKEND != "torch":
+		name += "+" + _BACKEND
+	return name
@@ -0,0 +1,156 @@
+import contextlib
+import json
+import threading
+import time
+
+# Process-wide registry. Timers accumulate [seconds, calls]; counters accumulate numbers.
+_LOCK = threading.Lock()
+_TIMERS = {}
+_COUNTERS = {}
+_LISTENERS = []
+
+# Names used by the pipeline; rates() derives throughput figures from them
+EXTRACT_PARSE = "extract.parse"
+EXTRACT_SECTIONS = "extract.sections"
+SPLIT = "split"
+TOKENIZE = "paraphrase.tokenize"
+GENERATE = "paraphrase.generate"
+DECODE = "paraphrase.decode"
+MODEL_LOAD = "model.load"
+# Per-request latency in the Gradio UI, extraction and paraphrasing of one document
+UI_REQUEST = "ui.request"
+UI_EXTRACT = "ui.extract"
+UI_PARAPHRASE = "ui.paraphrase"
+
+PAGES = "extract.pages"
+TOPICS = "split.topics"
+CHUNKS = "split.chunks"
+BATCHES = "paraphrase.batches"
+GENERATED_CHUNKS = "paraphrase.chunks"
+INPUT_TOKENS = "paraphrase.input_tokens"
+PAD_TOKENS = "paraphrase.pad_tokens"
+GENERATED_TOKENS = "paraphrase.generated_tokens"
+PARAPHRASE_CACHE_HITS = "cache.paraphrase.hits"
+PARAPHRASE_CACHE_MISSES = "cache.paraphrase.misses"
+EXTRACTION_CACHE_HITS = "cache.extraction.hits"
+EXTRACTION_CACHE_MISSES = "cache.extraction.misses"
+
+
+def add_listener(fn):
+    """Call fn(kind, name, value) for every recorded event; kind is "timer" (value in seconds) or "counter"."""
+    with _LOCK:
+        _LISTENERS.append(fn)
+
+
+def remove_listener(fn):
+    with _LOCK:
+        if fn in _LISTENERS:
+            _LISTENERS.remove(fn)
+
+
+def _notify(kind, name, value):
+    for fn in list(_LISTENERS):
+        try:
+            fn(kind, name, value)
+        except Exception:
+            # A broken exporter must never fail the pipeline
+            pass
+
+
+def record_time(name, seconds):
+    with _LOCK:
+        entry = _TIMERS.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+    _notify("timer", name, seconds)
+
+
+def count(name, n=1):
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + n
+    _notify("counter", name, n)
+
+
+class timed(contextlib.ContextDecorator):
+    """Time a block (`with timed("name"):`) or every call of a function (`@timed("name")`)."""
+
+    def __init__(self, name):
+        self.name = name
+        self._start = None
+
+    def _recreate_cm(self):
+        # A fresh instance per decorated call keeps concurrent and nested calls independent
+        return timed(self.name)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_time(self.name, time.perf_counter() - self._start)
+        return False
+
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if denominator else None
+
+
+def rates(timers=None, counters=None):
+    """Derived throughput figures from {name: seconds} timers and counters; None where a stage did not run."""
+    if timers is None or counters is None:
+        raw_timers, counters = raw()
+        timers = {name: seconds for name, (seconds, _calls) in raw_timers.items()}
+    c = {name: counters.get(name, 0) for name in (PAGES, GENERATED_CHUNKS, GENERATED_TOKENS, PAD_TOKENS,
+                                                  INPUT_TOKENS, BATCHES, PARAPHRASE_CACHE_HITS,
+                                                  PARAPHRASE_CACHE_MISSES, EXTRACTION_CACHE_HITS,
+                                                  EXTRACTION_CACHE_MISSES)}
+    model_seconds = timers.get(TOKENIZE, 0.0) + timers.get(GENERATE, 0.0) + timers.get(DECODE, 0.0)
+    return {
+        "pages_per_sec": _ratio(c[PAGES], timers.get(EXTRACT_PARSE, 0.0)),
+        "chunks_per_sec": _ratio(c[GENERATED_CHUNKS], model_seconds),
+        "generated_tokens_per_sec": _ratio(c[GENERATED_TOKENS], timers.get(GENERATE, 0.0)),
+        "padding_ratio": _ratio(c[PAD_TOKENS], c[INPUT_TOKENS]),
+        "mean_batch_size": _ratio(c[GENERATED_CHUNKS], c[BATCHES]),
+        "paraphrase_cache_hit_rate": _ratio(c[PARAPHRASE_CACHE_HITS],
+                                            c[PARAPHRASE_CACHE_HITS] + c[PARAPHRASE_CACHE_MISSES]),
+        "extraction_cache_hit_rate": _ratio(c[EXTRACTION_CACHE_HITS],
+                                            c[EXTRACTION_CACHE_HITS] + c[EXTRACTION_CACHE_MISSES]),
+    }
+
+
+def raw():
+    """(timers, counters) copies: {name: [seconds, calls]} and {name: value}. Picklable, for merge()."""
+    with _LOCK:
+        return {name: list(entry) for name, entry in _TIMERS.items()}, dict(_COUNTERS)
+
+
+def merge(raw_stats):
+    """Add stats recorded elsewhere (e.g. raw() from a worker process) to this process's registry."""
+    timers, counters = raw_stats
+    with _LOCK:
+        for name, (seconds, calls) in timers.items():
+            entry = _TIMERS.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+        for name, value in counters.items():
+            _COUNTERS[name] = _COUNTERS.get(name, 0) + value
+
+
+def reset():
+    with _LOCK:
+        _TIMERS.clear()
+        _COUNTERS.clear()
+
+
+def snapshot():
+    """All stats as a JSON-serialisable dict: timers, counters and derived rates."""
+    timers, counters = raw()
+    return {
+        "timers": {name: {"seconds": seconds, "calls": calls} for name, (seconds, calls) in sorted(timers.items())},
+        "counters": dict(sorted(counters.items())),
+        "rates": rates({name: seconds for name, (seconds, _calls) in timers.items()}, counters),
+    }
+
+
+def to_json(indent=2):
+    return json.dumps(snapshot(), indent=indent)
@@ -1,11 +1,15 @@
-from config import get_model_tokenizer_device, get_device
-from text_processing import split_into_topics
-from paraphrasing import paraphrase_chunks
-from pdf_extraction import extract_topics_from_pdf
+# torch/transformers (config, paraphrasing) are imported lazily so --server runs never load them
+from text_processing import split_into_topics, iter_topic_chunks
+from pdf_extraction import extract_sections_from_pdf, iter_topics_from_pdf
+from cache import get_extraction_cache, get_paraphrase_cache
+from checkpoint import JobCheckpoint, clear_jobs, job_id_for
+import instrumentation
+import memory_profile
 import os
-import torch
 import nltk
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from functools import partial
 
 # Download NLTK data once at module level with quiet flag
@@ -21,16 +25,17 @@ def _ensure_nltk_data():
 
 _ensure_nltk_data()
 
-def summarize_pdf(pdf_filename, paraphrase=True, paraphrase_kwargs=None):
+def summarize_pdf(pdf_filename, paraphrase=True, paraphrase_kwargs=None, pages=None):
+    from paraphrasing import paraphrase_chunks
     # Process PDF: Extract topics, split, paraphrase, and save (use fast sampling for extraction)
     # fast=True uses a small set of sampled pages to estimate font-size thresholds which speeds up large PDFs
+    # Sections are streamed, so paraphrasing of the first topic starts before the last page is parsed
     if paraphrase_kwargs is None:
         paraphrase_kwargs = {'batch_size': 16, 'num_beams': 1, 'max_length': 64, 'do_sample': True}
-    extracted_text = extract_topics_from_pdf(pdf_filename, fast=True, sample_pages=3)
-    topics = split_into_topics(extracted_text)
+    sections = iter_topics_from_pdf(pdf_filename, fast=True, sample_pages=3, pages=pages)
 
     output_parts = []
-    for topic, chunks in topics.items():
+    for topic, chunks in iter_topic_chunks(sections):
         if paraphrase:
             bullets = paraphrase_chunks(chunks, **paraphrase_kwargs)
         else:
@@ -48,73 +53,282 @@ def summarize_pdf(pdf_filename, paraphrase=True, paraphrase_kwargs=None):
     return output_filename
 
 
+def _instrumented_call(fn, document, profile_memory=False):
+    """Process-pool wrapper: run fn(document) and return its result with the stats and memory records made in the worker."""
+    instrumentation.reset()
+    memory_profile.reset()
+    if profile_memory:
+        memory_profile.start()
+    with memory_profile.stage('extract', document):
+        result = fn(document)
+    return result, instrumentation.raw(), memory_profile.records()
+
+
+def _extract_in_pool(pdfs, extract_fn, workers, max_in_flight, profile_memory=False):
+    """Yield (pdf, sections) as each extraction finishes, in completion order.
+
+    At most max_in_flight PDFs are submitted at once and the next one is only
+    submitted after the caller has taken a result, so a slow consumer throttles
+    extraction instead of letting finished results pile up in memory.
+    """
+    pending = iter(pdfs)
+    with ProcessPoolExecutor(max_workers=workers) as exc:
+        futures = {}
+
+        def submit_next():
+            pdf = next(pending, None)
+            if pdf is not None:
+                futures[exc.submit(_instrumented_call, extract_fn, pdf, profile_memory)] = pdf
+
+        for _ in range(max(1, max_in_flight)):
+            submit_next()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for fut in done:
+                pdf = futures.pop(fut)
+                try:
+                    sections, worker_stats, worker_memory = fut.result()
+                    instrumentation.merge(worker_stats)
+                    memory_profile.merge(worker_memory)
+                except Exception as e:
+                    print(f'Extraction failed for {pdf}:', e)
+                    sections = []
+                yield pdf, sections
+                submit_next()
+
+
+# With a checkpoint, topics are paraphrased in rounds of about this many chunks and saved
+# after each round, so an interrupted run only redoes the round in progress
+_CHECKPOINT_ROUND_CHUNKS = 256
+
+
+def _paraphrase_documents(topics_map, paraphrase_kwargs, paraphrase_fn, checkpoint=None):
+    """Paraphrase {pdf: {topic: chunks}}, pooling chunks across topics and documents.
+
+    Every chunk is tagged with its (document, topic, index) origin so the flat
+    output can be reassembled into {pdf: {topic: bullets}} in the original order.
+    Without a checkpoint everything goes through a single paraphrase_fn call; with
+    one, topics it already holds are reused and the rest are saved round by round.
+    """
+    result = {}
+    rounds = [[]]
+    pending_chunks = 0
+    for pdf_path, topics in topics_map.items():
+        result[pdf_path] = {}
+        for topic, chunks in topics.items():
+            bullets = checkpoint.topic_bullets(pdf_path, topic, chunks) if checkpoint is not None else None
+            result[pdf_path][topic] = bullets
+            if bullets is not None:
+                continue
+            if checkpoint is not None and pending_chunks >= _CHECKPOINT_ROUND_CHUNKS:
+                rounds.append([])
+                pending_chunks = 0
+            rounds[-1].append((pdf_path, topic, chunks))
+            pending_chunks += len(chunks)
+
+    for round_topics in rounds:
+        if not round_topics:
+            continue
+        origins = []
+        flat_chunks = []
+        for pdf_path, topic, chunks in round_topics:
+            result[pdf_path][topic] = [None] * len(chunks)
+            for i, chunk in enumerate(chunks):
+                origins.append((pdf_path, topic, i))
+                flat_chunks.append(chunk)
+
+        paraphrased = paraphrase_fn(flat_chunks, **paraphrase_kwargs)
+
+        for (pdf_path, topic, i), text in zip(origins, paraphrased):
+            result[pdf_path][topic][i] = text
+        if checkpoint is not None:
+            for pdf_path, topic, chunks in round_topics:
+                checkpoint.save_topic(pdf_path, topic, chunks, result[pdf_path][topic])
+    return result
+
+
+def _write_summary(pdf_path, bullets_by_topic):
+    """Write {topic: bullets} next to the PDF and return the output path."""
+    output_parts = []
+    for topic, bullets in bullets_by_topic.items():
+        output_parts.append(f"\n## {topic}\n")
+        output_parts.extend(f"• {b}\n" for b in bullets)
+    output_content = "".join(output_parts)
+
+    output_filename = pdf_path.replace('.pdf', '_paraphrased.txt')
+    with open(output_filename, 'w', encoding='utf-8') as f:
+        f.write(output_content)
+    return output_filename
+
+
 def run(argv=None):
     import argparse
     
     parser = argparse.ArgumentParser(description='Summarize PDF(s) and produce paraphrased text files.')
     parser.add_argument('pdfs', nargs='*', help='Path(s) to PDF file(s)')
     parser.add_argument('--workers', type=int, default=2, help='Number of processes to use for PDF text extraction (CPU-bound)')
-    parser.add_argument('--batch-size', type=int, default=16, help='Batch size for paraphrasing calls')
+    parser.add_argument('--page-workers', type=int, default=None, help='Processes used to parse the pages of each PDF (defaults to --workers when a single PDF is given, else 1)')
+    parser.add_argument('--batch-size', type=int, default=None, help='Batch size for paraphrasing calls (default 16; with --max-batch-tokens, an optional cap on rows per batch)')
+    parser.add_argument('--max-batch-tokens', type=int, default=None, help='Pack paraphrase batches up to this many tokens (rows x (input + output length)) instead of a fixed batch size')
+    parser.add_argument('--pages', default=None, help='Only extract and paraphrase these pages of each PDF, e.g. "3-5,9,20-" (1-based) or an outline section name like "Chapter 3"')
+    parser.add_argument('--heading-rule', choices=['stdev', 'percentile', 'body'], default='stdev', help='How the heading font-size threshold is derived: mean + 0.8 stdev, the 90th percentile of line sizes, or 1.15x the body text size')
+    parser.add_argument('--outline', action='store_true', help="Take topic headings from each PDF's bookmark outline when it has one (skips the font-size statistics)")
+    parser.add_argument('--keep-repeated', action='store_true', help='Keep running headers/footers and page numbers that repeat across pages')
+    parser.add_argument('--dedupe', choices=['none', 'exact', 'near'], default='exact', help='Generate repeated chunks (footers, slide titles, boilerplate) only once: exact ignores case/whitespace, near also merges near-duplicates')
+    parser.add_argument('--sort-by-length', action='store_true', help='Batch chunks of similar token length together to reduce padding')
+    parser.add_argument('--queue-size', type=int, default=2, help='Extracted documents that may wait for the paraphraser before extraction pauses')
+    parser.add_argument('--global-batch', action='store_true', help='Paraphrase the chunks of all PDFs as one pooled queue instead of one document at a time')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch', help='Inference backend for paraphrasing (onnx runs ONNX Runtime on CPU; needs optimum[onnxruntime])')
+    parser.add_argument('--int8', action='store_true', help='Run the paraphraser on CPU with dynamic int8 quantization (less memory, faster CPU generation)')
+    parser.add_argument('--tiny-model', action='store_true', help='Paraphrase with a small randomly initialised T5 built locally (no download; output is meaningless, for offline benchmarking)')
+    parser.add_argument('--server', default=None, help='URL of a running paraphrase_server.py; paraphrase there instead of loading the model')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for sampled paraphrase generation')
+    parser.add_argument('--resume', action='store_true', help='Checkpoint progress and skip documents and topics finished by an earlier run of the same job (same PDFs and options)')
+    parser.add_argument('--stats', nargs='?', const='-', default=None, metavar='PATH', help='Report per-stage timings, throughput, padding ratio and cache hit rates as JSON at the end (to PATH, or stdout)')
+    parser.add_argument('--profile-memory', nargs='?', const='-', default=None, metavar='PATH', help='Record peak RSS and tracemalloc snapshots per stage and document and report the top allocation sites (JSON to PATH, or a summary on stdout); slows the run down')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the extraction and paraphrase caches')
+    parser.add_argument('--clear-cache', action='store_true', help='Empty the on-disk extraction and paraphrase caches before running')
     args = parser.parse_args(argv)
+    try:
+        _run(args)
+    finally:
+        if args.stats:
+            _write_stats(args.stats)
+        if args.profile_memory:
+            memory_profile.write_report(args.profile_memory)
+
+
+def _write_stats(path):
+    stats = instrumentation.to_json()
+    if path == '-':
+        print(stats)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(stats + '\n')
+        print('Stats written to', path)
+
+
+def _run(args):
+
+    if args.server:
+        # Thin client: the server holds the model (and its own paraphrase cache)
+        from paraphrase_server import paraphrase_remote
+        paraphrase_fn = partial(paraphrase_remote, server_url=args.server)
+        print('paraphrase server:', args.server)
+    else:
+        import torch
+        from config import configure, get_device
+        from paraphrasing import paraphrase_chunks
+        configure(quantize_int8=args.int8, backend=args.backend, tiny_model=args.tiny_model or None)
+        paraphrase_fn = paraphrase_chunks
+
+        # Show device info so you know whether GPU fp16 is being used
+        print('torch.cuda.is_available():', torch.cuda.is_available())
+        print('device:', get_device())
 
-    # Show device info so you know whether GPU fp16 is being used
-    print('torch.cuda.is_available():', torch.cuda.is_available())
-    print('device:', get_device())
+    if args.profile_memory:
+        # After the torch/transformers imports, whose allocations would swamp every snapshot
+        memory_profile.start()
+
+    if args.clear_cache:
+        get_extraction_cache().clear()
+        get_paraphrase_cache().clear()
+        clear_jobs()
+        print('Extraction and paraphrase caches and job checkpoints cleared')
+    paraphrase_cache = None if (args.no_cache or args.server) else get_paraphrase_cache()
+
+    if args.batch_size is None and args.max_batch_tokens is None:
+        args.batch_size = 16
 
     if not args.pdfs:
         print('No PDF paths provided. Call this script with one or more PDF file paths.')
         return
 
+    checkpoint = None
+    pdfs = args.pdfs
+    if args.resume:
+        # Only options that change the written summaries identify the job
+        job_id = job_id_for(pdfs, pages=args.pages, heading_rule=args.heading_rule, outline=args.outline,
+                            keep_repeated=args.keep_repeated, backend=args.backend, int8=args.int8, tiny_model=args.tiny_model,
+                            server=args.server, seed=args.seed, dedupe=args.dedupe)
+        checkpoint = JobCheckpoint(job_id)
+        pdfs = [p for p in pdfs if not checkpoint.document_done(p)]
+        print(f'job {job_id}: {len(args.pdfs) - len(pdfs)} of {len(args.pdfs)} documents already done')
+        if not pdfs:
+            return
+
     # Phase 1: extract texts from PDFs in parallel (CPU-bound)
-    extract_fn = partial(extract_topics_from_pdf, fast=True, sample_pages=3)
-    extracted_map = {}
-    with ProcessPoolExecutor(max_workers=args.workers) as exc:
-        futures = {exc.submit(extract_fn, pdf): pdf for pdf in args.pdfs}
-        for fut in as_completed(futures):
-            pdf = futures[fut]
+    # A single large PDF cannot use the file-level pool, so shard its pages instead
+    page_workers = args.page_workers
+    if page_workers is None:
+        page_workers = args.workers if len(pdfs) == 1 else 1
+    extract_fn = partial(extract_sections_from_pdf, workers=page_workers, use_cache=not args.no_cache,
+                         strip_repeated=not args.keep_repeated, use_outline=args.outline,
+                         heading_rule=args.heading_rule, pages=args.pages)
+    extracted = _extract_in_pool(pdfs, extract_fn, args.workers, args.workers + args.queue_size,
+                                 profile_memory=bool(args.profile_memory))
+
+    paraphrase_kwargs = {'batch_size': args.batch_size, 'num_beams': 1, 'max_length': 64, 'do_sample': True,
+                         'seed': args.seed, 'cache': paraphrase_cache, 'sort_by_length': args.sort_by_length,
+                         'max_batch_tokens': args.max_batch_tokens,
+                         'dedupe': None if args.dedupe == 'none' else args.dedupe}
+
+    if args.global_batch:
+        # Pool every document's chunks into one queue so batches stay full across many small files
+        topics_map = {}
+        with memory_profile.stage('collect_topics'):
+            for pdf_path, sections in extracted:
+                if not sections:
+                    print(f'No text extracted for {pdf_path}, skipping')
+                    continue
+                with memory_profile.stage('split', pdf_path):
+                    topics_map[pdf_path] = split_into_topics(sections)
+        with memory_profile.stage('paraphrase', f'{len(topics_map)} documents'):
+            paraphrased_map = _paraphrase_documents(topics_map, paraphrase_kwargs, paraphrase_fn, checkpoint)
+        for pdf_path, bullets_by_topic in paraphrased_map.items():
+            output_path = _write_summary(pdf_path, bullets_by_topic)
+            if checkpoint is not None:
+                checkpoint.mark_document_done(pdf_path, output_path)
+            print('Generated:', output_path)
+        return
+
+    # Phase 2 overlaps phase 1: a consumer thread paraphrases each document as soon as it is
+    # extracted, while the bounded queue stops extraction from running far ahead of the model
+    work = queue.Queue(maxsize=args.queue_size)
+
+    def consume():
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            pdf_path, topics = item
             try:
-                text = fut.result()
+                with memory_profile.stage('paraphrase', pdf_path):
+                    paraphrased_map = _paraphrase_documents({pdf_path: topics}, paraphrase_kwargs, paraphrase_fn,
+                                                            checkpoint)
+                output_path = _write_summary(pdf_path, paraphrased_map[pdf_path])
+                if checkpoint is not None:
+                    checkpoint.mark_document_done(pdf_path, output_path)
+                print('Generated:', output_path)
             except Exception as e:
-                print(f'Extraction failed for {pdf}:', e)
-                text = ''
-            extracted_map[pdf] = text
-
-    # Phase 2: post-process and paraphrase using GPU in larger batches
-    for pdf_path, extracted_text in extracted_map.items():
-        if not extracted_text:
-            print(f'No text extracted for {pdf_path}, skipping')
-            continue
-        topics = split_into_topics(extracted_text)
+                print(f'Paraphrasing failed for {pdf_path}:', e)
+            finally:
+                work.task_done()
 
-        # Combine all chunks for this PDF into one list to allow large batches
-        all_chunks = []
-        topic_order = []
-        for topic, chunks in topics.items():
-            topic_order.append(topic)
-            all_chunks.append(chunks)
-
-        # Flatten while remembering boundaries
-        flat_chunks = [c for group in all_chunks for c in group]
-
-        paraphrase_kwargs = {'batch_size': args.batch_size, 'num_beams': 1, 'max_length': 64, 'do_sample': True}
-        paraphrased = paraphrase_chunks(flat_chunks, **paraphrase_kwargs)
-
-        # Re-group paraphrased outputs back into topics
-        output_parts = []
-        idx = 0
-        for topic, chunks in zip(topic_order, all_chunks):
-            count = len(chunks)
-            bullets = paraphrased[idx:idx+count]
-            idx += count
-            output_parts.append(f"\n## {topic}\n")
-            output_parts.extend(f"• {b}\n" for b in bullets)
-        output_content = "".join(output_parts)
-
-        output_filename = pdf_path.replace('.pdf', '_paraphrased.txt')
-        with open(output_filename, 'w', encoding='utf-8') as f:
-            f.write(output_content)
-        print('Generated:', output_filename)
-
-
-if __name__ == '__main__':
-    run()
\ No newline at end of file
+    consumer = threading.Thread(target=consume, name='paraphrase-consumer', daemon=True)
+    consumer.start()
+    try:
+        for pdf_path, sections in extracted:
+            if not sections:
+                print(f'No text extracted for {pdf_path}, skipping')
+                continue
+            with memory_profile.stage('split', pdf_path):
+                topics = split_into_topics(sections)
+            work.put((pdf_path, topics))
+            if args.profile_memory:
+                # tracemalloc has one process-wide peak: splitting the next document while this one is
+                # paraphrased would reset it mid-stage, so profiled runs paraphrase one document at a time
+                work.join()
+    finally:
+        work.put(None)
+        consumer.join()
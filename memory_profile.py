@@ -0,0 +1,234 @@
+import contextlib
+import json
+import linecache
+import os
+import sys
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Process-wide profile: stage() is a no-op until start() is called, so pipeline code can be
+# annotated unconditionally. Records are plain dicts (picklable, for merge() across processes).
+_LOCK = threading.Lock()
+_RECORDS = []
+_ACTIVE = False
+_TOP = 10
+_LOCAL = threading.local()
+
+# ru_maxrss is in kilobytes on Linux and bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+_MB = 1024 * 1024
+
+
+def start(top=10, frames=1):
+    """Start tracemalloc and record every stage() from now on; top is the number of allocation sites kept.
+
+    Call it after heavy imports (torch, transformers): snapshot cost grows with every live
+    traced allocation, and module import allocations would dominate the reports.
+    """
+    global _ACTIVE, _TOP
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _TOP = top
+    _ACTIVE = True
+
+
+def stop():
+    global _ACTIVE
+    _ACTIVE = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_active():
+    return _ACTIVE
+
+
+def _rss_mb():
+    """Current resident set size, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / _MB
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _rss_peak_mb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT / _MB
+
+
+def _cuda():
+    # Only report GPU memory when torch is already loaded; never import it here
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        return torch.cuda
+    return None
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, linecache.__file__),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+def _top_sites(before, after, top):
+    sites = []
+    for stat in after.compare_to(before, "lineno"):
+        if stat.size_diff <= 0:
+            continue
+        frame = stat.traceback[0]
+        sites.append({"site": f"{os.path.basename(frame.filename)}:{frame.lineno}",
+                      "file": frame.filename, "size_mb": stat.size_diff / _MB, "blocks": stat.count_diff})
+        if len(sites) >= top:
+            break
+    return sites
+
+
+class _Frame:
+    def __init__(self):
+        self.traced_peak = 0
+        self.cuda_peak = 0
+
+
+@contextlib.contextmanager
+def stage(name, document=None):
+    """Record traced memory peak and retained growth, RSS and the top allocation sites of the enclosed block.
+
+    Traced figures are relative to the traced memory at the start of the stage. tracemalloc
+    and CUDA peaks are process-wide, so nested stages fold their peaks into the enclosing
+    one; stages running concurrently in other threads overlap.
+    """
+    if not _ACTIVE:
+        yield
+        return
+    stack = getattr(_LOCAL, "stack", None)
+    if stack is None:
+        stack = _LOCAL.stack = []
+    cuda = _cuda()
+    if stack:
+        # Keep the enclosing stage's peak so far before resetting the counters for this one
+        stack[-1].traced_peak = max(stack[-1].traced_peak, tracemalloc.get_traced_memory()[1])
+        if cuda is not None:
+            stack[-1].cuda_peak = max(stack[-1].cuda_peak, cuda.max_memory_allocated())
+    frame = _Frame()
+    stack.append(frame)
+    before = _snapshot()
+    rss_peak_before = _rss_peak_mb()
+    traced_before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    if cuda is not None:
+        cuda.reset_peak_memory_stats()
+    try:
+        yield
+    finally:
+        traced_now, traced_peak = tracemalloc.get_traced_memory()
+        frame.traced_peak = max(frame.traced_peak, traced_peak)
+        if cuda is not None:
+            frame.cuda_peak = max(frame.cuda_peak, cuda.max_memory_allocated())
+        after = _snapshot()
+        stack.pop()
+        if stack:
+            stack[-1].traced_peak = max(stack[-1].traced_peak, frame.traced_peak)
+            stack[-1].cuda_peak = max(stack[-1].cuda_peak, frame.cuda_peak)
+        rss_peak = _rss_peak_mb()
+        record = {
+            "stage": name,
+            "document": None if document is None else str(document),
+            "pid": os.getpid(),
+            "traced_peak_mb": (frame.traced_peak - traced_before) / _MB,
+            "traced_retained_mb": (traced_now - traced_before) / _MB,
+            "rss_mb": _rss_mb(),
+            "rss_peak_mb": rss_peak,
+            "rss_peak_growth_mb": None if rss_peak is None else rss_peak - rss_peak_before,
+            "top": _top_sites(before, after, _TOP),
+        }
+        if cuda is not None:
+            record["cuda_peak_mb"] = frame.cuda_peak / _MB
+        with _LOCK:
+            _RECORDS.append(record)
+
+
+def records():
+    with _LOCK:
+        return list(_RECORDS)
+
+
+def merge(other_records):
+    """Add records made elsewhere (e.g. records() from a worker process)."""
+    with _LOCK:
+        _RECORDS.extend(other_records)
+
+
+def reset():
+    with _LOCK:
+        _RECORDS.clear()
+
+
+def report():
+    """{"records": [...], "stages": {name: summary}}; summaries keep the sites of the stage's largest peak."""
+    recs = records()
+    stages = {}
+    for rec in recs:
+        summary = stages.setdefault(rec["stage"], {"count": 0, "max_traced_peak_mb": 0.0,
+                                                   "max_rss_peak_mb": None, "worst_document": None, "top": []})
+        summary["count"] += 1
+        if rec["rss_peak_mb"] is not None:
+            summary["max_rss_peak_mb"] = max(summary["max_rss_peak_mb"] or 0.0, rec["rss_peak_mb"])
+        if rec["traced_peak_mb"] >= summary["max_traced_peak_mb"]:
+            summary["max_traced_peak_mb"] = rec["traced_peak_mb"]
+            summary["worst_document"] = rec["document"]
+            summary["top"] = rec["top"]
+    return {"records": recs, "stages": stages}
+
+
+def to_json(indent=2):
+    return json.dumps(report(), indent=indent)
+
+
+def _mb(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def _short(document):
+    return os.path.basename(document) if document else "-"
+
+
+def format_report(top=5):
+    """Human-readable summary: one line per record, then the top allocation sites per stage."""
+    rep = report()
+    lines = ["Memory profile (MB): traced peak and retained above stage start / RSS / RSS high-water (+growth in stage)"]
+    stage_width = max((len(rec["stage"]) for rec in rep["records"]), default=0)
+    doc_width = max((len(_short(rec["document"])) for rec in rep["records"]), default=0)
+    for rec in rep["records"]:
+        growth = rec["rss_peak_growth_mb"]
+        lines.append(f"  {rec['stage']:<{stage_width}} {_short(rec['document']):<{doc_width}} {_mb(rec['traced_peak_mb']):>8} "
+                     f"{_mb(rec['traced_retained_mb']):>8} {_mb(rec['rss_mb']):>8} {_mb(rec['rss_peak_mb']):>8}"
+                     f" (+{_mb(growth)})" + (f"  cuda peak {_mb(rec['cuda_peak_mb'])}" if "cuda_peak_mb" in rec else ""))
+    lines.append("Top allocation sites still held at the end of each stage (document with the largest peak):")
+    for name, summary in rep["stages"].items():
+        lines.append(f"  {name} ({_short(summary['worst_document'])}):")
+        for site in summary["top"][:top]:
+            lines.append(f"    {site['size_mb']:8.2f} MB {site['blocks']:>9} blocks  {site['site']}")
+    return "\n".join(lines)
+
+
+def write_report(path):
+    """Write the JSON report to path, or print the text summary when path is '-'."""
+    if path == "-":
+        print(format_report())
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(to_json() + "\n")
+        print(format_report())
+        print("Memory profile written to", path)
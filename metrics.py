@@ -0,0 +1,180 @@
+import contextlib
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import instrumentation
+
+DEFAULT_PORT = 9464
+_PREFIX = "notes_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+TOKENS_PER_SEC_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000)
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+# Fed by instrumentation events after install(): every timer becomes a *_seconds histogram
+# and every counter a *_total counter, plus batch-size and tokens/sec histograms
+_LOCK = threading.Lock()
+_HISTOGRAMS = {}
+_COUNTERS = {}
+_GAUGES = {}
+# Gauges read at scrape time: name -> callable returning the current value
+_GAUGE_FNS = {}
+_HELP = {}
+_INSTALLED = False
+# Generation time of the batch this thread is working on, paired with its token count
+_LOCAL = threading.local()
+
+
+def _metric_name(name, suffix):
+    return _PREFIX + _NAME_RE.sub("_", name) + suffix
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def render(self, name):
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.sum:.6f}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, help_text=None):
+    """Add value to histogram `name` (full metric name), creating it on first use."""
+    with _LOCK:
+        hist = _HISTOGRAMS.get(name)
+        if hist is None:
+            hist = _HISTOGRAMS[name] = _Histogram(buckets)
+            _HELP[name] = help_text or name
+        hist.observe(value)
+
+
+def inc_gauge(name, delta=1, help_text=None):
+    with _LOCK:
+        _GAUGES[name] = _GAUGES.get(name, 0) + delta
+        _HELP.setdefault(name, help_text or name)
+
+
+def register_gauge(name, fn, help_text=None):
+    """Export fn() as gauge `name` (full metric name), evaluated on every render()."""
+    with _LOCK:
+        _GAUGE_FNS[name] = fn
+        _HELP[name] = help_text or name
+
+
+def register_coalescer(backlog_fn):
+    """Export a coalescer's backlog_fn() -> (requests, chunks) as queue-depth gauges."""
+    register_gauge(_PREFIX + "coalescer_queued_requests", lambda: backlog_fn()[0],
+                   "Paraphrase requests waiting for the model (queued or being collected into a batch)")
+    register_gauge(_PREFIX + "coalescer_queued_chunks", lambda: backlog_fn()[1],
+                   "Chunks waiting for the model (queued or being collected into a batch)")
+
+
+@contextlib.contextmanager
+def in_flight(name="requests"):
+    """Count the enclosed block in the <name>_in_flight gauge while it runs."""
+    gauge = _metric_name(name, "_in_flight")
+    inc_gauge(gauge, 1, help_text=f"{name} currently being processed")
+    try:
+        yield
+    finally:
+        inc_gauge(gauge, -1)
+
+
+def _on_event(kind, name, value):
+    if kind == "timer":
+        if name == instrumentation.GENERATE:
+            _LOCAL.generate_seconds = value
+        observe(_metric_name(name, "_seconds"), value, help_text=f"Duration of {name} in seconds")
+        return
+    metric = _metric_name(name, "_total")
+    with _LOCK:
+        _COUNTERS[metric] = _COUNTERS.get(metric, 0) + value
+        _HELP.setdefault(metric, f"Total {name}")
+    if name == instrumentation.GENERATED_CHUNKS:
+        observe(_PREFIX + "batch_size", value, BATCH_SIZE_BUCKETS, "Chunks per generate() batch")
+    elif name == instrumentation.GENERATED_TOKENS:
+        seconds = getattr(_LOCAL, "generate_seconds", None)
+        if seconds:
+            observe(_PREFIX + "generated_tokens_per_second", value / seconds, TOKENS_PER_SEC_BUCKETS,
+                    "Generated tokens per second of generate() time, per batch")
+        _LOCAL.generate_seconds = None
+
+
+def install():
+    """Start turning instrumentation events into metrics (idempotent)."""
+    global _INSTALLED
+    with _LOCK:
+        if _INSTALLED:
+            return
+        _INSTALLED = True
+    instrumentation.add_listener(_on_event)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _LOCK:
+        gauge_fns = dict(_GAUGE_FNS)
+    # Callbacks run outside the lock; they may take locks of their own
+    gauges = {}
+    for name, fn in gauge_fns.items():
+        try:
+            gauges[name] = fn()
+        except Exception:
+            continue
+    with _LOCK:
+        gauges.update(_GAUGES)
+        for name in sorted(_COUNTERS):
+            lines += [f"# HELP {name} {_HELP[name]}", f"# TYPE {name} counter", f"{name} {_COUNTERS[name]}"]
+        for name in sorted(gauges):
+            lines += [f"# HELP {name} {_HELP[name]}", f"# TYPE {name} gauge", f"{name} {gauges[name]}"]
+        for name in sorted(_HISTOGRAMS):
+            lines += [f"# HELP {name} {_HELP[name]}", f"# TYPE {name} histogram"]
+            lines += _HISTOGRAMS[name].render(name)
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the console
+        pass
+
+
+def start_metrics_server(host="127.0.0.1", port=DEFAULT_PORT):
+    """install() and serve GET /metrics on host:port from a daemon thread; returns the server."""
+    install()
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
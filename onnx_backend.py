@@ -0,0 +1,33 @@
+import os
+
+# ONNX exports are kept beside the Hugging Face cache so they share its location and lifetime
+_ONNX_SUBDIR = "onnx"
+
+
+def onnx_cache_dir(model_name):
+    """Directory holding the ONNX export of model_name (under $HF_HOME, default ~/.cache/huggingface)."""
+    hf_home = os.environ.get("HF_HOME") or os.path.join(os.path.expanduser("~"), ".cache", "huggingface")
+    return os.path.join(hf_home, _ONNX_SUBDIR, model_name.replace("/", "--"))
+
+
+def load_onnx_model(model_name):
+    """Return an ONNX Runtime seq2seq model for model_name, exporting it on first use.
+
+    The encoder and decoder (with past key/values) are exported once and reloaded from
+    onnx_cache_dir() afterwards. The returned model exposes the same generate() API as
+    the PyTorch model, so greedy and beam search go through the usual code path but run
+    on ONNX Runtime's CPU execution provider.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError:
+        raise RuntimeError("The ONNX backend requires optimum and onnxruntime: pip install optimum[onnxruntime]")
+
+    path = onnx_cache_dir(model_name)
+    if os.path.exists(os.path.join(path, "config.json")):
+        return ORTModelForSeq2SeqLM.from_pretrained(path, provider="CPUExecutionProvider")
+
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, provider="CPUExecutionProvider")
+    os.makedirs(path, exist_ok=True)
+    model.save_pretrained(path)
+    return model
@@ -0,0 +1,155 @@
+# Long-running paraphrase daemon that keeps the model warm, plus a thin client.
+# Start it with `python paraphrase_server.py`, then point main.py (--server URL) or the
+# Gradio UI (NOTES_SUMMARIZER_SERVER=URL) at it. The client only uses the standard library,
+# so callers skip importing torch/transformers and loading the weights.
+import json
+import urllib.request
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+
+DEFAULT_PORT = 8765
+# Generation options a client may set, with their accepted JSON types; everything else is fixed by the server
+_OPTION_TYPES = {
+    'batch_size': (int, type(None)),
+    'num_beams': (int,),
+    'max_length': (int,),
+    'do_sample': (bool,),
+    'seed': (int, type(None)),
+    'sort_by_length': (bool,),
+    'max_batch_tokens': (int, type(None)),
+    'dedupe': (str, type(None)),
+}
+_ALLOWED_OPTIONS = tuple(_OPTION_TYPES)
+# Longest a request may wait for its paraphrases (the client's default timeout)
+_REQUEST_TIMEOUT_S = 600
+
+
+def _check_options(options):
+    """Keep the allowed options, raising ValueError for a value of the wrong type."""
+    if not isinstance(options, dict):
+        raise ValueError('options must be an object')
+    checked = {}
+    for name, value in options.items():
+        if name not in _OPTION_TYPES:
+            continue
+        types = _OPTION_TYPES[name]
+        # bool is a subclass of int, but true/false is not a valid batch size
+        if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+            raise ValueError(f'option {name!r} has the wrong type')
+        checked[name] = value
+    return checked
+
+
+def paraphrase_remote(chunks, server_url, timeout=600, **options):
+    """Paraphrase chunks on a running paraphrase server; same result shape as paraphrase_chunks."""
+    if not chunks:
+        return []
+    options = {k: v for k, v in options.items() if k in _ALLOWED_OPTIONS}
+    payload = json.dumps({'chunks': list(chunks), 'options': options}).encode('utf-8')
+    request = urllib.request.Request(server_url.rstrip('/') + '/paraphrase', data=payload,
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        body = json.loads(response.read().decode('utf-8'))
+    if 'error' in body:
+        raise RuntimeError(f"Paraphrase server error: {body['error']}")
+    return body['paraphrases']
+
+
+def _make_handler(coalescer):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status, obj):
+            data = json.dumps(obj).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send_json(200, {'status': 'ok'})
+            elif self.path == '/stats':
+                import instrumentation
+                self._send_json(200, instrumentation.snapshot())
+            elif self.path == '/metrics':
+                data = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', metrics.CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self._send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/paraphrase':
+                self._send_json(404, {'error': 'not found'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length).decode('utf-8'))
+                chunks = request['chunks']
+                if not isinstance(chunks, list) or not all(isinstance(c, str) for c in chunks):
+                    raise ValueError('chunks must be a list of strings')
+                options = _check_options(request.get('options', {}))
+            except Exception as e:
+                self._send_json(400, {'error': f'bad request: {e}'})
+                return
+            try:
+                with metrics.in_flight():
+                    paraphrases = coalescer.paraphrase(chunks, timeout=_REQUEST_TIMEOUT_S, **options)
+            except FutureTimeoutError:
+                self._send_json(504, {'error': 'timed out waiting for the paraphraser'})
+                return
+            except Exception as e:
+                self._send_json(500, {'error': str(e)})
+                return
+            self._send_json(200, {'paraphrases': paraphrases})
+
+        def log_message(self, format, *args):
+            # Keep the daemon quiet; one line per request is noise at this request rate
+            pass
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, window=0.01, use_cache=True):
+    """Load the model, then serve POST /paraphrase on host:port until interrupted."""
+    from config import get_model_tokenizer_device, get_device
+    from cache import get_paraphrase_cache
+    from coalescer import RequestCoalescer
+
+    # Before loading so the model load time is exported too
+    metrics.install()
+    get_model_tokenizer_device()
+    options = {'cache': get_paraphrase_cache()} if use_cache else {}
+    coalescer = RequestCoalescer(window=window, **options)
+    metrics.register_coalescer(coalescer.backlog)
+    server = ThreadingHTTPServer((host, port), _make_handler(coalescer))
+    print(f'Paraphrase server on http://{host}:{server.server_port} (device: {get_device()})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve the paraphrase model over localhost HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind (keep the default to stay local)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--window-ms', type=float, default=10, help='How long to wait for concurrent requests to share a batch')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch', help='Inference backend')
+    parser.add_argument('--int8', action='store_true', help='Dynamic int8 quantization on CPU')
+    parser.add_argument('--tiny-model', action='store_true', help='Serve a small randomly initialised T5 built locally (offline testing)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not memoise paraphrases')
+    args = parser.parse_args()
+
+    from config import configure
+    configure(quantize_int8=args.int8, backend=args.backend, tiny_model=args.tiny_model or None)
+    serve(args.host, args.port, window=args.window_ms / 1000.0, use_cache=not args.no_cache)
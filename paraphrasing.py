@@ -1,5 +1,8 @@
 import torch
-from config import get_model_tokenizer_device
+import difflib
+from config import get_model_tokenizer_device, get_model_name
+from text_processing import dedupe_chunks
+import instrumentation
 from math import ceil
 
 def paraphrase(text, num_return_sequences=1, max_length=256, num_beams=2, do_sample=False):
@@ -47,30 +50,56 @@ def paraphrase(text, num_return_sequences=1, max_length=256, num_beams=2, do_sam
     return paraphrased
 
 
-def paraphrase_chunks(chunks, batch_size=8, num_beams=2, max_length=128, do_sample=False):
-    """
-    Paraphrase a list of text chunks using batched generation to reduce overhead.
+def _input_text(chunk):
+    return "paraphrase: " + chunk + " </s>"
 
-    Args:
-        chunks (List[str]): list of strings to paraphrase
-        batch_size (int): number of chunks to process in one forward pass
-        num_beams (int): beam size (lower -> faster)
-        max_length (int): max generation length
-        do_sample (bool): whether to sample (set False for deterministic output)
 
-    Returns:
-        List[str]: paraphrased strings in same order
+def _token_lengths(tokenizer, chunks):
+    """Tokenized input length of each chunk (no padding), as the model will see it."""
+    encoding = tokenizer([_input_text(c) for c in chunks], max_length=512, truncation=True)
+    return [len(ids) for ids in encoding["input_ids"]]
+
+
+def _plan_batches(indices, batch_size, lengths=None, max_batch_tokens=None, max_length=0, num_beams=1):
+    """Split chunk indices into batches of at most batch_size (None = no row limit).
+
+    With lengths, indices are ordered longest first so every batch holds chunks of
+    similar length and little padding is generated; callers write results back by
+    index, which restores the original order.
+
+    With max_batch_tokens, batches are packed greedily so that
+    rows * num_beams * (padded input length + max_length) stays within the budget.
+    A chunk that exceeds the budget on its own still gets a batch of one.
     """
-    if not chunks:
-        return []
+    if lengths is not None:
+        indices = sorted(indices, key=lambda i: lengths[i], reverse=True)
+    if max_batch_tokens is None:
+        if batch_size is None:
+            return [indices] if indices else []
+        return [indices[i:i+batch_size] for i in range(0, len(indices), batch_size)]
 
-    # Load model once outside the loop
-    model, tokenizer, device = get_model_tokenizer_device()
-    total = len(chunks)
-    bullets = []
-    for i in range(0, total, batch_size):
-        batch = chunks[i:i+batch_size]
-        inputs = ["paraphrase: " + c + " </s>" for c in batch]
+    batches = []
+    current = []
+    padded_len = 0
+    for i in indices:
+        new_padded_len = max(padded_len, lengths[i])
+        cost = (len(current) + 1) * num_beams * (new_padded_len + max_length)
+        full = batch_size is not None and len(current) >= batch_size
+        if current and (cost > max_batch_tokens or full):
+            batches.append(current)
+            current = []
+            new_padded_len = lengths[i]
+        current.append(i)
+        padded_len = new_padded_len
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _generate_batch(model, tokenizer, device, batch, num_beams, max_length, do_sample):
+    """Paraphrase one batch of chunks with a single model.generate call."""
+    inputs = [_input_text(c) for c in batch]
+    with instrumentation.timed(instrumentation.TOKENIZE):
         encoding = tokenizer.batch_encode_plus(
             inputs,
             max_length=512,
@@ -82,21 +111,16 @@ def paraphrase_chunks(chunks, batch_size=8, num_beams=2, max_length=128, do_samp
         attention_mask = encoding.get("attention_mask")
         if attention_mask is not None:
             attention_mask = attention_mask.to(device)
+    instrumentation.count(instrumentation.BATCHES)
+    instrumentation.count(instrumentation.INPUT_TOKENS, input_ids.numel())
+    if attention_mask is not None:
+        instrumentation.count(instrumentation.PAD_TOKENS, input_ids.numel() - int(attention_mask.sum()))
 
-        # Generate under no_grad and optionally autocast for fp16 on CUDA
-        use_autocast = (device.type == 'cuda' and getattr(model, 'dtype', None) == torch.float16)
-        with torch.no_grad():
-            if use_autocast:
-                with torch.cuda.amp.autocast():
-                    outputs = model.generate(
-                        input_ids=input_ids,
-                        attention_mask=attention_mask,
-                        max_length=max_length,
-                        num_beams=num_beams,
-                        num_return_sequences=1,
-                        do_sample=do_sample
-                    )
-            else:
+    # Generate under no_grad and optionally autocast for fp16 on CUDA
+    use_autocast = (device.type == 'cuda' and getattr(model, 'dtype', None) == torch.float16)
+    with torch.no_grad(), instrumentation.timed(instrumentation.GENERATE):
+        if use_autocast:
+            with torch.cuda.amp.autocast():
                 outputs = model.generate(
                     input_ids=input_ids,
                     attention_mask=attention_mask,
@@ -105,9 +129,179 @@ def paraphrase_chunks(chunks, batch_size=8, num_beams=2, max_length=128, do_samp
                     num_return_sequences=1,
                     do_sample=do_sample
                 )
+        else:
+            outputs = model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                max_length=max_length,
+                num_beams=num_beams,
+                num_return_sequences=1,
+                do_sample=do_sample
+            )
+
+    # Decoder-start token excluded; padding after an early EOS is not generated work
+    instrumentation.count(instrumentation.GENERATED_CHUNKS, len(batch))
+    instrumentation.count(instrumentation.GENERATED_TOKENS, int((outputs[:, 1:] != tokenizer.pad_token_id).sum()))
+
+    # Batch decode is faster than decoding one by one
+    with instrumentation.timed(instrumentation.DECODE):
+        return tokenizer.batch_decode(outputs, skip_special_tokens=True, clean_up_tokenization_spaces=True)
+
+
+def paraphrase_chunks(chunks, batch_size=8, num_beams=2, max_length=128, do_sample=False, seed=None, cache=None,
+                      sort_by_length=False, max_batch_tokens=None, dedupe=None):
+    """
+    Paraphrase a list of text chunks using batched generation to reduce overhead.
+
+    Args:
+        chunks (List[str]): list of strings to paraphrase
+        batch_size (int): number of chunks to process in one forward pass (with max_batch_tokens,
+            an upper bound on rows per batch); None for no row limit
+        num_beams (int): beam size (lower -> faster)
+        max_length (int): max generation length
+        do_sample (bool): whether to sample (set False for deterministic output)
+        seed (int): if given, seed torch before generating so sampled output is reproducible
+        cache (cache.ParaphraseCache): if given, reuse earlier paraphrases of identical chunks
+            generated with the same model and settings; only misses reach model.generate
+        sort_by_length (bool): batch chunks of similar tokenized length together to cut padding;
+            output order is unchanged
+        max_batch_tokens (int): pack as many chunks per batch as fit in this token budget, counted
+            as rows * num_beams * (padded input length + max_length); implies sort_by_length
+        dedupe (str): None, "exact" (ignore case/whitespace) or "near" (also MinHash near-duplicates);
+            each group of duplicates is generated once and the result copied to every position
+
+    Returns:
+        List[str]: paraphrased strings in same order
+    """
+    if not chunks:
+        return []
+
+    if dedupe:
+        if dedupe not in ("exact", "near"):
+            raise ValueError(f"dedupe must be None, 'exact' or 'near', not {dedupe!r}")
+        unique, positions = dedupe_chunks(chunks, near=(dedupe == "near"))
+        if len(unique) < len(chunks):
+            paraphrased = paraphrase_chunks(unique, batch_size, num_beams, max_length, do_sample, seed, cache,
+                                            sort_by_length, max_batch_tokens)
+            return [paraphrased[p] for p in positions]
+
+    results = [None] * len(chunks)
+    keys = None
+    pending = list(range(len(chunks)))
+    if cache is not None:
+        model_name = get_model_name()
+        keys = [cache.key(model_name, c, num_beams, max_length, do_sample, seed) for c in chunks]
+        hits = cache.get_many(keys)
+        pending = []
+        for i, k in enumerate(keys):
+            if k in hits:
+                results[i] = hits[k]
+            else:
+                pending.append(i)
+        instrumentation.count(instrumentation.PARAPHRASE_CACHE_HITS, len(chunks) - len(pending))
+        instrumentation.count(instrumentation.PARAPHRASE_CACHE_MISSES, len(pending))
+        if not pending:
+            return results
+
+    # Load model once outside the loop
+    model, tokenizer, device = get_model_tokenizer_device()
+    lengths = None
+    if sort_by_length or max_batch_tokens is not None:
+        pending_lengths = _token_lengths(tokenizer, [chunks[j] for j in pending])
+        lengths = dict(zip(pending, pending_lengths))
+    batches = _plan_batches(pending, batch_size, lengths, max_batch_tokens, max_length, num_beams)
+    if seed is not None:
+        torch.manual_seed(seed)
+    for batch_idx in batches:
+        batch_paraphrased = _generate_batch(model, tokenizer, device, [chunks[j] for j in batch_idx],
+                                            num_beams, max_length, do_sample)
+        for j, text in zip(batch_idx, batch_paraphrased):
+            results[j] = text
+        if cache is not None:
+            cache.set_many((keys[j], results[j]) for j in batch_idx)
+
+    return results
+
+
+def compare_outputs(reference, candidate):
+    """Summarise how close two lists of paraphrases are.
+
+    Returns a dict with the exact-match rate, the mean difflib similarity ratio and
+    the lowest ratio seen, plus the pairs that differ.
+    """
+    ratios = []
+    mismatches = []
+    for ref, cand in zip(reference, candidate):
+        ratio = difflib.SequenceMatcher(None, ref, cand).ratio()
+        ratios.append(ratio)
+        if ref != cand:
+            mismatches.append((ref, cand))
+    n = len(ratios)
+    return {
+        'n': n,
+        'exact_match': (n - len(mismatches)) / n if n else 1.0,
+        'mean_similarity': sum(ratios) / n if n else 1.0,
+        'min_similarity': min(ratios) if ratios else 1.0,
+        'mismatches': mismatches,
+    }
+
+
+def check_agreement(texts, max_length=64, min_similarity=0.9, quantize_int8=False, backend="torch"):
+    """Greedy-decode texts with the fp32 torch model and with a candidate variant, and compare.
+
+    Both models are loaded fresh on CPU, independently of the shared model in config.
+    Returns the compare_outputs() report with an extra 'ok' flag that is True when the
+    mean similarity reaches min_similarity.
+    """
+    from config import load_model, load_tokenizer
+    tokenizer = load_tokenizer()
+    cpu = torch.device('cpu')
+    reference = _generate_batch(load_model(cpu), tokenizer, cpu, texts, 1, max_length, False)
+    candidate_model = load_model(cpu, quantize_int8=quantize_int8, backend=backend)
+    candidate = _generate_batch(candidate_model, tokenizer, cpu, texts, 1, max_length, False)
+    report = compare_outputs(reference, candidate)
+    report['ok'] = report['mean_similarity'] >= min_similarity
+    return report
+
+
+def check_int8_agreement(texts, max_length=64, min_similarity=0.9):
+    """check_agreement() for the dynamic int8 CPU model."""
+    return check_agreement(texts, max_length, min_similarity, quantize_int8=True)
+
+
+def check_onnx_agreement(texts, max_length=64):
+    """check_agreement() for the ONNX Runtime backend; greedy output must match exactly."""
+    return check_agreement(texts, max_length, min_similarity=1.0, backend="onnx")
+
+
+if __name__ == "__main__":
+    import argparse
 
-        # Batch decode is faster than decoding one by one
-        batch_paraphrased = tokenizer.batch_decode(outputs, skip_special_tokens=True, clean_up_tokenization_spaces=True)
-        bullets.extend(batch_paraphrased)
+    parser = argparse.ArgumentParser(description="Paraphrasing utilities")
+    parser.add_argument("texts", nargs="*", help="Sentences to check (a few built-in samples are used if omitted)")
+    parser.add_argument("--check-int8", action="store_true", help="Compare int8-quantized CPU output against fp32 output")
+    parser.add_argument("--check-onnx", action="store_true", help="Check that ONNX Runtime greedy output matches the torch output")
+    parser.add_argument("--min-similarity", type=float, default=0.9, help="Mean similarity required to pass the int8 check")
+    args = parser.parse_args()
 
-    return bullets
\ No newline at end of file
+    samples = args.texts or [
+        "Gradient descent updates the weights in the direction that reduces the loss.",
+        "A validation set is used to tune hyperparameters without touching the test data.",
+        "Regularisation penalises large weights to reduce overfitting on small datasets.",
+        "The learning rate controls how far each update moves the parameters.",
+    ]
+    if not (args.check_int8 or args.check_onnx):
+        parser.print_help()
+        raise SystemExit(0)
+    ok = True
+    for label, enabled, check in (("int8", args.check_int8, lambda: check_int8_agreement(samples, min_similarity=args.min_similarity)),
+                                  ("onnx", args.check_onnx, lambda: check_onnx_agreement(samples))):
+        if not enabled:
+            continue
+        report = check()
+        print(f"[{label}] exact match: {report['exact_match']:.2%}  mean similarity: {report['mean_similarity']:.3f}  "
+              f"min similarity: {report['min_similarity']:.3f}")
+        for ref, cand in report['mismatches']:
+            print(f"  fp32: {ref}\n  {label}: {cand}")
+        ok = ok and report['ok']
+    raise SystemExit(0 if ok else 1)
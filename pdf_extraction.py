@@ -2,235 +2,714 @@ import fitz  # This is the PyMuPDF library
 import re
 import os
 import math
+import hashlib
+import itertools
 import statistics
-from typing import Iterable
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import instrumentation
+import memory_profile
 
 # Precompile regexes used frequently to avoid recompilation cost
 _BULLET_CLEAN_RE = re.compile(r'[•◦\u2022\u2023\u25E6\*\u2024]+')
 _WHITESPACE_RE = re.compile(r"\s+")
 _BULLET_DETECT_RE = re.compile(r'^\s*([•◦\u2022\u2023\u25E6\*\-\u2024]|\d+[\.)])\s+')
+_BULLET_LINE_RE = re.compile(r'^\s*([•◦\u2022\u2023\u25E6\*\u2024]|\d+[\.)])\s+')
+
 
-def extract_topics_from_pdf(pdf_path, write_to_file=False, fast=False, sample_pages=4):
+class Section(NamedTuple):
+    """One extracted topic: its heading, cleaned paragraphs and the pages it spans.
+
+    heading is None for content found before the first heading. paragraphs holds
+    (text, is_bullet) pairs; page numbers are 0-based.
     """
-    Extracts content from a PDF and formats it into <TOPIC> blocks.
+    heading: Optional[str]
+    paragraphs: List[Tuple[str, bool]]
+    first_page: int
+    last_page: int
+
+    @property
+    def topic(self) -> str:
+        return self.heading.upper() if self.heading else "Unnamed Topic"
+
+    def body_lines(self) -> List[str]:
+        """Body lines in the layout of the <TOPIC> text format (bullets prefixed with '- ')."""
+        return ['- ' + text if is_bullet else text for text, is_bullet in self.paragraphs]
+
+    def to_text(self) -> str:
+        """Render the section in the <TOPIC> text format used by extract_topics_from_pdf."""
+        parts = []
+        if self.heading is not None:
+            parts.append(f"\n<{self.heading.upper()}>\n")
+        for text, is_bullet in self.paragraphs:
+            if is_bullet:
+                parts.append('- ')
+                parts.append(text)
+                parts.append('\n')
+            else:
+                parts.append(text)
+                parts.append('\n\n')
+        return ''.join(parts)
 
-    This function identifies topics by assuming that text with a larger-than-average
-    font size is a heading. It's a heuristic that works well for many documents!
 
-    Args:
-        pdf_path (str): The file path to the PDF.
-        write_to_file (bool): If True, write the formatted content to a .txt file with the same name as the PDF.
+# Instead of a fixed font size threshold, derive a threshold per-document
+# using statistics on observed font sizes (more robust across PDFs).
+# PDFs use only a handful of distinct sizes, so a histogram of quantized sizes is
+# tiny, exact enough, and can be merged across page shards or streamed pages.
+_SIZE_SCALE = 100  # sizes are kept in 1/100 pt
 
-    Returns:
-        str: The formatted text.
-    """
+
+class _FontHistogram:
+    def __init__(self):
+        self.counts = {}
+        self.n = 0
+
+    def add(self, size: float, count: int = 1):
+        key = round(size * _SIZE_SCALE)
+        remaining = self.counts.get(key, 0) + count
+        if remaining > 0:
+            self.counts[key] = remaining
+        else:
+            self.counts.pop(key, None)
+        self.n += count
+
+    def merge(self, other: "_FontHistogram"):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.n += other.n
+
+    def mean(self):
+        return sum(key * count for key, count in self.counts.items()) / self.n / _SIZE_SCALE if self.n else 0.0
+
+    def pstdev(self):
+        if self.n == 0:
+            return 0.0
+        mean = self.mean() * _SIZE_SCALE
+        variance = sum(count * (key - mean) ** 2 for key, count in self.counts.items()) / self.n
+        return math.sqrt(variance) / _SIZE_SCALE
+
+    def percentile(self, q: float):
+        """Nearest-rank q-th percentile (0-100) of the line sizes."""
+        rank = max(1, math.ceil(q / 100.0 * self.n))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= rank:
+                return key / _SIZE_SCALE
+        return 0.0
+
+    def body_size(self):
+        """Most common line size, i.e. the size of the running text."""
+        return max(self.counts.items(), key=lambda kv: (kv[1], -kv[0]))[0] / _SIZE_SCALE if self.counts else 0.0
+
+    def next_size_above(self, size: float):
+        larger = [key for key in self.counts if key > round(size * _SIZE_SCALE)]
+        return min(larger) / _SIZE_SCALE if larger else None
+
+
+# How the heading threshold is derived from the font histogram:
+#   stdev      - mean + 0.8 * stdev of the line sizes (the original heuristic)
+#   percentile - sizes at or above the 90th percentile, but always above the body size
+#   body       - sizes at least 1.15x the most common (body text) size
+HEADING_RULES = ("stdev", "percentile", "body")
+_HEADING_PERCENTILE = 90
+_BODY_SIZE_RATIO = 1.15
+
+
+# Bump whenever extraction heuristics change so stale cache entries are not reused
+EXTRACTOR_VERSION = 5
+
+# Below this many pages per worker the process start-up cost outweighs the gain
+_MIN_PAGES_PER_SHARD = 8
+
+# Running headers/footers: a line no larger than the body text is dropped when the same text
+# (digits ignored, so page numbers match) sits in the same vertical band on at least this
+# share of the pages. Numbered titles such as "Step 1" ... "Step 8" share a signature too;
+# they survive because they are set larger than the body text
+_Y_BANDS = 100
+_REPEAT_FRACTION = 0.5
+_MIN_REPEAT_PAGES = 3
+_DIGITS_RE = re.compile(r'\d+')
+_PAGE_RANGE_RE = re.compile(r'^(\d*)\s*-\s*(\d*)$')
+
+
+def _line_signature(line_text, y0, page_height):
+    """Stable id of a line's normalised text and vertical band, used to spot running headers/footers."""
+    band = int(y0 / page_height * _Y_BANDS) if page_height else 0
+    norm = _DIGITS_RE.sub('#', _WHITESPACE_RE.sub(' ', line_text).strip().lower())
+    digest = hashlib.blake2b(f"{band}|{norm}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+# "dict" output defaults to TEXTFLAGS_DICT, which also decodes every image into the block
+# list. Only text lines are used, so ask for text blocks only (identical lines, much less
+# work on scanned or image-heavy pages).
+TEXT_ONLY_FLAGS = fitz.TEXTFLAGS_TEXT
+FULL_DICT_FLAGS = fitz.TEXTFLAGS_DICT
+
+
+def _page_line_records(page, page_num, flags=TEXT_ONLY_FLAGS):
+    """Return (page_num, line_text, max_font_size, min_x, signature) for every non-empty line on a page."""
+    records = []
+    page_height = page.rect.height
+    blocks = page.get_text("dict", flags=flags)["blocks"]
+    for block in blocks:
+        if "lines" not in block:
+            continue
+        for line in block["lines"]:
+            # Single pass over the spans: only size, left edge and text are needed
+            max_font_size = 0
+            min_x = math.inf
+            line_parts = []
+            for span in line.get("spans", ()):
+                size = span.get("size", 0)
+                if size > max_font_size:
+                    max_font_size = size
+                x0 = span.get("bbox", (0.0,))[0]
+                if x0 < min_x:
+                    min_x = x0
+                # Join span texts with a single space to preserve word boundaries
+                text = span.get("text", "").strip()
+                if text:
+                    line_parts.append(text)
+            line_text = " ".join(line_parts)
+            if not line_text:
+                continue
+            signature = _line_signature(line_text, line.get("bbox", (0, 0, 0, 0))[1], page_height)
+            records.append((page_num, line_text, max_font_size, min_x, signature))
+    return records
+
+
+def _collect_pages(doc, page_numbers, flags=TEXT_ONLY_FLAGS):
+    """Parse the given pages of an open document into line records plus their font histogram."""
+    page_lines = []
+    font_hist = _FontHistogram()
+    for page_num in page_numbers:
+        records = _page_line_records(doc[page_num], page_num, flags)
+        for record in records:
+            font_hist.add(record[2])
+        page_lines.extend(records)
+    return page_lines, font_hist
+
+
+def _extract_page_shard(pdf_path, page_numbers):
+    """Process-pool worker: reopen the PDF and parse one contiguous run of pages."""
+    doc = fitz.open(pdf_path)
     try:
-        doc = fitz.open(pdf_path)
-    except Exception as e:
-        return f"Error opening PDF: {e}"
+        return _collect_pages(doc, page_numbers)
+    finally:
+        doc.close()
 
-    structured_content = []
-    current_content = []
 
-    # Instead of a fixed font size threshold, derive a threshold per-document
-    # using statistics on observed font sizes (more robust across PDFs).
-    # We'll use an online accumulator for mean/stdev to avoid storing all font sizes
-    class Welford:
-        def __init__(self):
-            self.n = 0
-            self.mean = 0.0
-            self.m2 = 0.0
+def _shard_pages(page_numbers, workers):
+    # A few shards per worker keeps the pool busy when some pages are much heavier than others
+    page_numbers = list(page_numbers)
+    n_shards = max(1, min(workers * 4, len(page_numbers) // _MIN_PAGES_PER_SHARD))
+    step = math.ceil(len(page_numbers) / n_shards)
+    return [page_numbers[i:i + step] for i in range(0, len(page_numbers), step)]
+
+
+def _collect_pages_parallel(pdf_path, page_numbers, workers):
+    """Shard a single document's pages across a process pool and merge the results in page order."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    shards = _shard_pages(page_numbers, workers)
+    page_lines = []
+    font_hist = _FontHistogram()
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as exc:
+        futures = [exc.submit(_extract_page_shard, pdf_path, shard) for shard in shards]
+        # Shards are contiguous page runs, so consuming them in submission order keeps page order
+        for fut in futures:
+            shard_lines, shard_hist = fut.result()
+            page_lines.extend(shard_lines)
+            font_hist.merge(shard_hist)
+    return page_lines, font_hist
+
+
+def _header_sized(size, body_size):
+    # Running headers and footers are set at or below the body size; larger text is a title
+    return round(size * _SIZE_SCALE) <= round(body_size * _SIZE_SCALE)
+
+
+def _add_signature_occurrences(occurrences, records):
+    """Append (page_num, size) of every record to occurrences[signature]; line texts are not kept."""
+    for page_num, _text, size, _x, signature in records:
+        occurrences.setdefault(signature, []).append((page_num, size))
+
+
+def _repeated_signatures(occurrences, n_pages, body_size):
+    """Signatures of lines that recur in the same vertical band on many pages (headers, footers, watermarks)."""
+    if n_pages < _MIN_REPEAT_PAGES:
+        return set()
+    min_pages = max(_MIN_REPEAT_PAGES, math.ceil(n_pages * _REPEAT_FRACTION))
+    repeated = set()
+    for signature, seen in occurrences.items():
+        if len(seen) < min_pages:
+            continue
+        if len({page_num for page_num, size in seen if _header_sized(size, body_size)}) >= min_pages:
+            repeated.add(signature)
+    return repeated
+
+
+def _drop_repeated(page_lines, font_hist, repeated, body_size):
+    """Remove the repeated lines from page_lines and their sizes from font_hist."""
+    kept = []
+    for record in page_lines:
+        if record[4] in repeated and _header_sized(record[2], body_size):
+            font_hist.add(record[2], -1)
+        else:
+            kept.append(record)
+    return kept
 
-        def add(self, x: float):
-            self.n += 1
-            delta = x - self.mean
-            self.mean += delta / self.n
-            delta2 = x - self.mean
-            self.m2 += delta * delta2
 
-        def variance(self):
-            return self.m2 / self.n if self.n > 0 else 0.0
+def _collect_page_stats(doc, page_numbers, with_signatures=True):
+    """Font histogram and (optionally) signature occurrences of the given pages.
 
-        def pstdev(self):
-            return math.sqrt(self.variance())
+    Unlike _collect_pages, the line records are dropped page by page, so memory does
+    not grow with the text of the document.
+    """
+    font_hist = _FontHistogram()
+    occurrences = {}
+    for page_num in page_numbers:
+        records = _page_line_records(doc[page_num], page_num)
+        for record in records:
+            font_hist.add(record[2])
+        if with_signatures:
+            _add_signature_occurrences(occurrences, records)
+    return font_hist, occurrences
 
-    font_acc = Welford()
-    page_lines = []  # store (page_num, line_text, max_font_size, min_x)
 
-    # Optionally sample only a few pages for faster stats estimation
-    total_pages = len(doc)
+def _discount_repeated(font_hist, occurrences, repeated, body_size):
+    """Remove the sizes of the repeated lines recorded in occurrences from font_hist."""
+    for signature in repeated:
+        for _page_num, size in occurrences[signature]:
+            if _header_sized(size, body_size):
+                font_hist.add(size, -1)
+
+
+def _sample_pages(page_numbers, sample_pages):
+    # Choose which pages to sample for font stats when streaming with fast=True
+    step = max(1, len(page_numbers) // sample_pages)
+    return page_numbers[::step]
 
-    # Choose which pages to sample for font stats when fast=True
-    sample_set = set()
-    if fast and total_pages > 0:
-        step = max(1, total_pages // sample_pages)
-        sample_set = set(range(0, total_pages, step))
-
-    for page_num, page in enumerate(doc):
-        blocks = page.get_text("dict")["blocks"]
-        for block in blocks:
-            if "lines" in block:
-                for line in block["lines"]:
-                    spans = line.get("spans", [])
-                    if not spans:
-                        continue
-                    max_font_size = max((span.get("size", 0) for span in spans), default=0)
-                    # compute left-most x coordinate of the spans for indent detection
-                    try:
-                        min_x = min((span.get('bbox', [0,0,0,0])[0] for span in spans))
-                    except Exception:
-                        min_x = 0.0
-                    # Join span texts with a single space to preserve word boundaries
-                    line_parts = []
-                    for span in spans:
-                        text = span.get("text", "").strip()
-                        if text:
-                            line_parts.append(text)
-                    line_text = " ".join(line_parts).strip()
-                    if not line_text:
-                        continue
-                    # Only add to font accumulator if we're sampling this page or not in fast mode
-                    if (not fast) or (page_num in sample_set):
-                        font_acc.add(max_font_size)
-                    page_lines.append((page_num, line_text, max_font_size, min_x))
-
-    if font_acc.n == 0:
-        doc.close()
-        return ""
 
+# Characters that may follow a section name given as a prefix of the outline title
+_OUTLINE_PREFIX_SEPARATORS = (':', '.', '-', ' ')
+
+
+def _outline_spans(doc):
+    """(level, title, first_page, last_page) per outline entry, pages 0-based and inclusive.
+
+    An entry runs up to the page where the next entry of the same or a higher level
+    starts (that page included, as the section usually ends on it).
+    """
+    toc = doc.get_toc(simple=True)
+    spans = []
+    for i, (level, title, page) in enumerate(toc):
+        if page < 1:
+            continue
+        last_page = len(doc) - 1
+        for next_level, _title, next_page in toc[i + 1:]:
+            if next_level <= level and next_page >= 1:
+                last_page = max(page - 1, next_page - 1)
+                break
+        spans.append((level, _WHITESPACE_RE.sub(' ', title).strip(), page - 1, min(last_page, len(doc) - 1)))
+    return spans
+
+
+def _outline_section_pages(doc, name):
+    key = _outline_key(name)
+    spans = _outline_spans(doc)
+    matches = [span for span in spans if _outline_key(span[1]) == key]
+    if not matches:
+        # "Chapter 3" selects "Chapter 3: Regularisation" but not "Chapter 30"; nested entries
+        # such as "Chapter 3.1" lie inside the top match, so only the shallowest level counts
+        matches = [span for span in spans if _outline_key(span[1]).startswith(key)
+                   and _outline_key(span[1])[len(key):len(key) + 1] in _OUTLINE_PREFIX_SEPARATORS]
+        if matches:
+            top_level = min(span[0] for span in matches)
+            matches = [span for span in matches if span[0] == top_level]
+            if len(matches) > 1:
+                titles = ', '.join(repr(span[1]) for span in matches)
+                raise ValueError(f"Outline section name {name!r} is ambiguous: {titles}")
+    if not matches:
+        raise ValueError(f"No outline section named {name!r}")
+    pages = set()
+    for _level, _title, first_page, last_page in matches:
+        pages.update(range(first_page, last_page + 1))
+    return pages
+
+
+def _resolve_pages(doc, pages):
+    """Turn a page selection into a sorted list of 0-based page indices.
+
+    pages is a string such as "1-3,7,10-" (1-based, inclusive, open-ended ranges
+    allowed, outline section names as items) or an iterable of 1-based page numbers
+    and such items. Pages past the end of the document are ignored.
+    """
+    total_pages = len(doc)
+    items = pages.split(',') if isinstance(pages, str) else pages
+    selected = set()
+    for item in items:
+        if isinstance(item, int):
+            selected.add(item - 1)
+            continue
+        item = item.strip()
+        if not item:
+            continue
+        if item.isdigit():
+            selected.add(int(item) - 1)
+            continue
+        match = _PAGE_RANGE_RE.match(item)
+        if match and any(match.groups()):
+            start = int(match.group(1)) if match.group(1) else 1
+            end = int(match.group(2)) if match.group(2) else total_pages
+            if match.group(1) and match.group(2) and end < start:
+                raise ValueError(f"Page range {item!r} is reversed")
+            selected.update(range(start - 1, min(end, total_pages)))
+            continue
+        selected.update(_outline_section_pages(doc, item))
+    return sorted(p for p in selected if 0 <= p < total_pages)
+
+
+def _heading_threshold(font_hist, heading_rule="stdev"):
+    if font_hist.n == 0:
+        return None
+    if heading_rule == "percentile":
+        body = font_hist.body_size()
+        above_body = font_hist.next_size_above(body)
+        if above_body is None:
+            return math.inf
+        return max(font_hist.percentile(_HEADING_PERCENTILE), above_body)
+    if heading_rule == "body":
+        return font_hist.body_size() * _BODY_SIZE_RATIO
     # Heuristic: heading threshold = mean + 0.8 * stdev (works across many documents)
-    mean_size = font_acc.mean
-    stdev_size = font_acc.pstdev() if font_acc.n > 1 else 0.0
-    HEADING_FONT_THRESHOLD = mean_size + 0.8 * stdev_size
-
-    # Build structured content using the computed threshold
-    for (_page_num, line_text, max_font_size, min_x) in page_lines:
-        if max_font_size >= HEADING_FONT_THRESHOLD and len(line_text) > 2:
-            if current_content:
-                # store content as a list of (text, indent)
-                structured_content.append(current_content)
-                current_content = []
-            structured_content.append(f"<TOPIC>{line_text}")
-        else:
-            current_content.append((line_text, min_x))
+    return font_hist.mean() + 0.8 * font_hist.pstdev()
 
-    # Add any remaining content after processing pages
-    if current_content:
-        structured_content.append(current_content)
-
-    doc.close()
-
-    # Filter out short or irrelevant topic sections (improved logic)
-    filtered_content = []
-    i = 0
-    while i < len(structured_content):
-        if isinstance(structured_content[i], str) and structured_content[i].startswith("<TOPIC>"):
-            # next item is expected to be a list of (text, indent)
-            if i + 1 < len(structured_content) and not (isinstance(structured_content[i + 1], str) and structured_content[i + 1].startswith("<TOPIC>")):
-                content_list = structured_content[i + 1]
-                # require minimum meaningful content length OR presence of multiple lines
-                content_lines = [ln for ln, _ in content_list if ln.strip()]
-                if len(" ".join(content_lines)) >= 80 and len(content_lines) >= 2:
-                    filtered_content.append(structured_content[i])
-                    filtered_content.append(content_list)
-                elif len(content_lines) >= 6:
-                    filtered_content.append(structured_content[i])
-                    filtered_content.append(content_list)
-            i += 2
-        else:
-            filtered_content.append(structured_content[i])
-            i += 1
-
-    # Post-processing helpers to reduce noise
-    def clean_line(ln: str) -> str:
-        # remove bullet characters, odd unicode bullets, and excessive spaces
-        ln = re.sub(r'[•◦\u2022\u2023\u25E6\*\u2024]+', '', ln)
-        ln = ln.replace('\u2013', '-').replace('\u2014', '-')
-        ln = re.sub(r"\s+", ' ', ln).strip()
-        return ln
-
-    def join_paragraph_lines(lines_with_indent):
-        # lines_with_indent: list of (orig_line, indent)
-        # join wrapped lines into paragraphs; handle hyphenated line endings
-        # preserve bullet/list lines as separate items; also detect lists by indent pattern
-        out = []
-        buf = ''
-        bullet_re = re.compile(r'^\s*([•◦\u2022\u2023\u25E6\*\u2024]|\d+[\.)])\s+')
-
-        # compute common indent among candidate list lines
-        indents = [indent for _, indent in lines_with_indent]
-        median_indent = statistics.median(indents) if indents else 0.0
-
-        for orig_ln, indent in lines_with_indent:
-            stripped_ln = orig_ln.rstrip()
-            # detect bullet/numbered list at the start of the original line
-            is_bullet = bool(bullet_re.match(stripped_ln))
-            # also treat as bullet if indent is significantly greater than median (indented list)
-            if not is_bullet and indent - median_indent > 10:
-                is_bullet = True
-
-            ln = clean_line(stripped_ln)
-            if not ln:
-                continue
 
-            if is_bullet:
-                # flush any buffered paragraph before adding a bullet item
-                if buf:
-                    out.append({'text': buf, 'is_bullet': False})
-                    buf = ''
-                out.append({'text': ln, 'is_bullet': True})
-                continue
+def _font_headings(page_lines, heading_threshold):
+    """Mark line records whose font size reaches heading_threshold as headings."""
+    for record in page_lines:
+        yield record, record[2] >= heading_threshold and len(record[1]) > 2
 
-            if buf:
-                if buf.endswith('-'):
-                    buf = buf[:-1] + ln  # de-hyphenate
-                else:
-                    # Only join when the next line clearly continues the sentence.
-                    # Continue if next line starts lowercase (continuation)
-                    if ln and ln[0].islower():
-                        buf = buf + ' ' + ln
-                    else:
-                        # otherwise treat as a new paragraph/line — flush current buffer
-                        out.append({'text': buf, 'is_bullet': False})
-                        buf = ln
+
+def _outline_titles(doc):
+    """Map page index -> titles of the PDF outline (bookmarks) pointing at that page; empty without an outline."""
+    titles_by_page = {}
+    for _level, title, page in doc.get_toc(simple=True):
+        title = _WHITESPACE_RE.sub(' ', title).strip()
+        # Entries without a destination have page <= 0
+        if title and 1 <= page <= len(doc):
+            titles_by_page.setdefault(page - 1, []).append(title)
+    return titles_by_page
+
+
+def _outline_key(text):
+    return _WHITESPACE_RE.sub(' ', text).strip().casefold()
+
+
+def _outline_headings(page_lines, titles_by_page):
+    """Mark the lines that match an outline title on its target page as headings.
+
+    Titles that cannot be found in the page text (different wording, text in an image)
+    still open a section, as a synthetic heading line at the top of their page.
+    """
+    for page_num, records in itertools.groupby(page_lines, key=lambda record: record[0]):
+        records = list(records)
+        pending = {}
+        for title in titles_by_page.get(page_num, ()):
+            pending.setdefault(_outline_key(title), title)
+        matched = {}
+        for idx, record in enumerate(records):
+            key = _outline_key(record[1])
+            if key in pending:
+                matched[idx] = pending.pop(key)
+            elif len(key) >= 8:
+                # A heading wrapped over several lines only matches the outline title by its first line
+                for title_key in pending:
+                    if title_key.startswith(key):
+                        matched[idx] = pending.pop(title_key)
+                        break
+        for title in pending.values():
+            yield (page_num, title, 0.0, 0.0, 0), True
+        for idx, record in enumerate(records):
+            if idx in matched:
+                yield (page_num, matched[idx]) + record[2:], True
             else:
-                buf = ln
+                yield record, False
+
+
+def _iter_raw_sections(marked_lines):
+    """Group (line record, is_heading) pairs into (heading, [(text, indent), ...], first_page, last_page) runs.
 
-            # flush when a line ends with punctuation that likely ends a paragraph
-            if buf.endswith(('.', '!', '?')):
+    heading is None for the run before the first heading.
+    """
+    heading = None
+    current_content = []
+    first_page = last_page = 0
+    for (page_num, line_text, max_font_size, min_x, _signature), is_heading in marked_lines:
+        if is_heading:
+            if heading is not None or current_content:
+                yield heading, current_content, first_page, last_page
+            heading = line_text
+            current_content = []
+            first_page = page_num
+        else:
+            if heading is None and not current_content:
+                first_page = page_num
+            current_content.append((line_text, min_x))
+        last_page = page_num
+
+    # Add any remaining content after processing pages
+    if heading is not None or current_content:
+        yield heading, current_content, first_page, last_page
+
+
+def _keep_section(heading, content_list):
+    """Filter out short or irrelevant topic sections."""
+    if heading is None:
+        return bool(content_list)
+    # require minimum meaningful content length OR presence of multiple lines
+    content_lines = [ln for ln, _ in content_list if ln.strip()]
+    if len(" ".join(content_lines)) >= 80 and len(content_lines) >= 2:
+        return True
+    return len(content_lines) >= 6
+
+
+# Post-processing helpers to reduce noise
+def _clean_line(ln: str) -> str:
+    # remove bullet characters, odd unicode bullets, and excessive spaces
+    ln = _BULLET_CLEAN_RE.sub('', ln)
+    ln = ln.replace('\u2013', '-').replace('\u2014', '-')
+    ln = _WHITESPACE_RE.sub(' ', ln).strip()
+    return ln
+
+
+def _join_paragraph_lines(lines_with_indent):
+    # lines_with_indent: list of (orig_line, indent)
+    # join wrapped lines into paragraphs; handle hyphenated line endings
+    # preserve bullet/list lines as separate items; also detect lists by indent pattern
+    out = []
+    buf = ''
+
+    # compute common indent among candidate list lines
+    indents = [indent for _, indent in lines_with_indent]
+    median_indent = statistics.median(indents) if indents else 0.0
+
+    for orig_ln, indent in lines_with_indent:
+        stripped_ln = orig_ln.rstrip()
+        # detect bullet/numbered list at the start of the original line
+        is_bullet = bool(_BULLET_LINE_RE.match(stripped_ln))
+        # also treat as bullet if indent is significantly greater than median (indented list)
+        if not is_bullet and indent - median_indent > 10:
+            is_bullet = True
+
+        ln = _clean_line(stripped_ln)
+        if not ln:
+            continue
+
+        if is_bullet:
+            # flush any buffered paragraph before adding a bullet item
+            if buf:
                 out.append({'text': buf, 'is_bullet': False})
                 buf = ''
+            out.append({'text': ln, 'is_bullet': True})
+            continue
 
         if buf:
-            out.append({'text': buf, 'is_bullet': False})
-        return out
+            if buf.endswith('-'):
+                buf = buf[:-1] + ln  # de-hyphenate
+            else:
+                # Only join when the next line clearly continues the sentence.
+                # Continue if next line starts lowercase (continuation)
+                if ln and ln[0].islower():
+                    buf = buf + ' ' + ln
+                else:
+                    # otherwise treat as a new paragraph/line — flush current buffer
+                    out.append({'text': buf, 'is_bullet': False})
+                    buf = ln
+        else:
+            buf = ln
 
-    output_parts = []
-    for item in filtered_content:
-        if isinstance(item, str) and item.startswith("<TOPIC>"):
-            topic_name = item.replace("<TOPIC>", "").strip()
-            output_parts.append(f"\n<{topic_name.upper()}>\n")
+        # flush when a line ends with punctuation that likely ends a paragraph
+        if buf.endswith(('.', '!', '?')):
+            out.append({'text': buf, 'is_bullet': False})
+            buf = ''
+
+    if buf:
+        out.append({'text': buf, 'is_bullet': False})
+    return out
+
+
+def _build_paragraphs(content_list):
+    """Turn a section's raw (text, indent) lines into cleaned (text, is_bullet) paragraphs."""
+    lines_with_indent = [(ln, indent) for ln, indent in content_list if ln.strip()]
+    paragraphs = []
+    for p in _join_paragraph_lines(lines_with_indent):
+        text = p['text']
+        is_bullet = p['is_bullet']
+        # drop very short noisy lines unless it's a bullet/list item
+        if len(text) < 30 and not is_bullet:
+            continue
+        # keep bullets as individual lines
+        if text and text[-1].isalnum():
+            text += '.'
+        paragraphs.append((text, is_bullet))
+    return paragraphs
+
+
+def _iter_sections(marked_lines):
+    for heading, content_list, first_page, last_page in _iter_raw_sections(marked_lines):
+        if _keep_section(heading, content_list):
+            yield Section(heading, _build_paragraphs(content_list), first_page, last_page)
+
+
+def _sections_from_doc(doc, pdf_path, workers, strip_repeated, use_outline, heading_rule, pages):
+    """Extract the Sections of an already opened document; closes doc."""
+    try:
+        page_numbers = list(range(len(doc))) if pages is None else _resolve_pages(doc, pages)
+        titles_by_page = _outline_titles(doc) if use_outline else {}
+    except Exception:
+        doc.close()
+        raise
+
+    # page_lines stores (page_num, line_text, max_font_size, min_x, signature). Every page
+    # is parsed anyway, so the font histogram always covers the whole document
+    with instrumentation.timed(instrumentation.EXTRACT_PARSE), memory_profile.stage(instrumentation.EXTRACT_PARSE, pdf_path):
+        if workers and workers > 1 and len(page_numbers) >= 2 * _MIN_PAGES_PER_SHARD:
+            doc.close()
+            page_lines, font_hist = _collect_pages_parallel(pdf_path, page_numbers, workers)
         else:
-            # item is a list of (text, indent)
-            lines_with_indent = [(ln, indent) for ln, indent in item if ln.strip()]
-            paragraphs = join_paragraph_lines(lines_with_indent)
-            for p in paragraphs:
-                text = p['text']
-                is_bullet = p['is_bullet']
-                # drop very short noisy lines unless it's a bullet/list item
-                if len(text) < 30 and not is_bullet:
-                    continue
-                # keep bullets as individual lines
-                if text and text[-1].isalnum():
-                    text += '.'
-                if is_bullet:
-                    output_parts.append('- ')
-                    output_parts.append(text)
-                    output_parts.append('\n')
-                else:
-                    output_parts.append(text)
-                    output_parts.append('\n\n')
-    output = ''.join(output_parts)
+            page_lines, font_hist = _collect_pages(doc, page_numbers)
+            doc.close()
+    instrumentation.count(instrumentation.PAGES, len(page_numbers))
+
+    with instrumentation.timed(instrumentation.EXTRACT_SECTIONS), memory_profile.stage(instrumentation.EXTRACT_SECTIONS, pdf_path):
+        return _sections_from_lines(page_lines, font_hist, len(page_numbers), strip_repeated, titles_by_page,
+                                    heading_rule)
+
+
+def _sections_from_lines(page_lines, font_hist, n_pages, strip_repeated, titles_by_page, heading_rule):
+    """Classify headings in parsed line records and group them into Sections."""
+    # Drop running headers/footers before they skew the font statistics or become content
+    if strip_repeated:
+        body_size = font_hist.body_size()
+        occurrences = {}
+        _add_signature_occurrences(occurrences, page_lines)
+        repeated = _repeated_signatures(occurrences, n_pages, body_size)
+        occurrences = None
+        if repeated:
+            page_lines = _drop_repeated(page_lines, font_hist, repeated, body_size)
+
+    # A bookmark outline names the sections directly, so the font statistics are not needed
+    if titles_by_page:
+        return list(_iter_sections(_outline_headings(page_lines, titles_by_page)))
+
+    heading_threshold = _heading_threshold(font_hist, heading_rule)
+    if heading_threshold is None:
+        return []
+    return list(_iter_sections(_font_headings(page_lines, heading_threshold)))
+
+
+def _extraction_cache_key(pdf_path, **params):
+    from cache import file_digest, make_key
+    # workers only changes how pages are scheduled, not the result, so it is not part of the key
+    return make_key("sections", EXTRACTOR_VERSION, file_digest(pdf_path), **params)
+
+
+def _check_heading_rule(heading_rule):
+    if heading_rule not in HEADING_RULES:
+        raise ValueError(f"Unknown heading_rule {heading_rule!r}; expected one of {HEADING_RULES}")
+
+
+def _pages_key(pages):
+    return pages if pages is None or isinstance(pages, str) else list(pages)
+
+
+def _cached_sections(doc, pdf_path, workers, use_cache, strip_repeated, use_outline, heading_rule, pages):
+    """_sections_from_doc, consulting the on-disk extraction cache first when use_cache is set."""
+    _check_heading_rule(heading_rule)
+    if not use_cache:
+        return _sections_from_doc(doc, pdf_path, workers, strip_repeated, use_outline, heading_rule, pages)
+    from cache import get_extraction_cache
+    cache = get_extraction_cache()
+    key = _extraction_cache_key(pdf_path, strip_repeated=strip_repeated, use_outline=use_outline,
+                                heading_rule=heading_rule, pages=_pages_key(pages))
+    sections = cache.get(key)
+    if sections is not None:
+        instrumentation.count(instrumentation.EXTRACTION_CACHE_HITS)
+        doc.close()
+        return sections
+    instrumentation.count(instrumentation.EXTRACTION_CACHE_MISSES)
+    sections = _sections_from_doc(doc, pdf_path, workers, strip_repeated, use_outline, heading_rule, pages)
+    cache.set(key, sections)
+    return sections
+
+
+def extract_sections_from_pdf(pdf_path, fast=False, sample_pages=4, workers=1, use_cache=False, strip_repeated=True,
+                              use_outline=False, heading_rule="stdev", pages=None):
+    """
+    Extracts the topics of a PDF as a list of Section objects.
+
+    Same heuristics as extract_topics_from_pdf, but without the <TOPIC> text
+    serialisation, so callers such as split_into_topics can consume the structure
+    directly. Raises if the PDF cannot be opened.
+
+    With use_cache=True the result is looked up in (and stored to) the on-disk
+    extraction cache, keyed by the file's content hash, the extraction parameters
+    and EXTRACTOR_VERSION.
+
+    With strip_repeated=True (default), lines repeated at the same vertical position on
+    many pages (running headers, footers, page numbers, watermarks) are dropped before
+    headings are classified.
+
+    With use_outline=True and a PDF that has a bookmark outline, the outline entries
+    are used as the section headings and the font-size statistics are skipped; PDFs
+    without an outline fall back to the font-size heuristic.
+
+    heading_rule picks how the font-size threshold is derived (see HEADING_RULES).
+    Font statistics always cover every page; fast and sample_pages are accepted for
+    compatibility and only matter for iter_topics_from_pdf.
+
+    pages restricts extraction to part of the document, e.g. "3-5", "1,4,10-" or an
+    outline section name like "Chapter 3" (1-based page numbers; see _resolve_pages).
+    Only the selected pages are parsed. Raises ValueError for an unknown section name.
+    """
+    return _cached_sections(fitz.open(pdf_path), pdf_path, workers, use_cache, strip_repeated, use_outline,
+                            heading_rule, pages)
+
+
+def extract_topics_from_pdf(pdf_path, write_to_file=False, fast=False, sample_pages=4, workers=1, use_cache=False,
+                            strip_repeated=True, use_outline=False, heading_rule="stdev", pages=None):
+    """
+    Extracts content from a PDF and formats it into <TOPIC> blocks.
+
+    This function identifies topics by assuming that text with a larger-than-average
+    font size is a heading. It's a heuristic that works well for many documents!
+
+    Args:
+        pdf_path (str): The file path to the PDF.
+        write_to_file (bool): If True, write the formatted content to a .txt file with the same name as the PDF.
+        workers (int): If > 1, parse the pages of this single document in a process pool of this size.
+        use_cache (bool): If True, reuse a previous extraction of the same file from the on-disk cache.
+        strip_repeated (bool): If True, drop running headers/footers/page numbers repeated across pages.
+        use_outline (bool): If True, take headings from the PDF's bookmark outline when it has one.
+        heading_rule (str): "stdev" (default), "percentile" or "body"; how the heading font-size threshold is chosen.
+        pages (str or list): Only extract these pages, e.g. "3-5,9" or an outline section name (1-based).
+
+    Returns:
+        str: The formatted text.
+    """
+    try:
+        doc = fitz.open(pdf_path)
+    except Exception as e:
+        return f"Error opening PDF: {e}"
+
+    try:
+        sections = _cached_sections(doc, pdf_path, workers, use_cache, strip_repeated, use_outline, heading_rule, pages)
+    except ValueError as e:
+        return f"Error selecting pages: {e}"
+    output = ''.join(section.to_text() for section in sections)
 
     if write_to_file:
         base = os.path.basename(pdf_path)
@@ -240,6 +719,89 @@ def extract_topics_from_pdf(pdf_path, write_to_file=False, fast=False, sample_pa
 
     return output
 
+
+def iter_topics_from_pdf(pdf_path, fast=True, sample_pages=4, use_cache=False, strip_repeated=True, use_outline=False,
+                         heading_rule="stdev", pages=None):
+    """
+    Streaming variant of extract_sections_from_pdf.
+
+    Yields each Section as soon as the next heading has been parsed, so only one
+    section is held in memory at a time. Content before the first heading is not
+    yielded (split_into_topics discards it as well).
+
+    The heading threshold has to be known before the first page is classified, so font
+    statistics are gathered up front: from the sampled pages when fast=True, or in a
+    stats-only pass over every page otherwise. Repeated headers/footers are detected
+    from the same pages. With use_outline=True and a bookmark outline, no font
+    statistics are needed. pages selects part of the document as in
+    extract_sections_from_pdf.
+
+    With use_cache=True a cached extraction is replayed without opening the PDF, and a
+    fully consumed stream is written to the cache.
+    """
+    _check_heading_rule(heading_rule)
+    cache = key = None
+    if use_cache:
+        from cache import get_extraction_cache
+        cache = get_extraction_cache()
+        # Header/footer detection only sees the stats pages here, so results are keyed apart from the full extractor's
+        key = _extraction_cache_key(pdf_path, fast=fast, sample_pages=sample_pages, strip_repeated=strip_repeated,
+                                    use_outline=use_outline, heading_rule=heading_rule, pages=_pages_key(pages),
+                                    streaming=True)
+        sections = cache.get(key)
+        instrumentation.count(instrumentation.EXTRACTION_CACHE_HITS if sections is not None
+                              else instrumentation.EXTRACTION_CACHE_MISSES)
+        if sections is not None:
+            yield from (section for section in sections if section.heading is not None)
+            return
+
+    doc = fitz.open(pdf_path)
+    try:
+        page_numbers = list(range(len(doc))) if pages is None else _resolve_pages(doc, pages)
+        stats_pages = _sample_pages(page_numbers, sample_pages) if fast else page_numbers
+        titles_by_page = _outline_titles(doc) if use_outline else {}
+        repeated = set()
+        body_size = 0.0
+        if strip_repeated or not titles_by_page:
+            # Only sizes and (page, size) per line signature are kept, never the line texts
+            with instrumentation.timed(instrumentation.EXTRACT_PARSE):
+                font_hist, occurrences = _collect_page_stats(doc, stats_pages, with_signatures=strip_repeated)
+            if strip_repeated:
+                body_size = font_hist.body_size()
+                repeated = _repeated_signatures(occurrences, len(stats_pages), body_size)
+                _discount_repeated(font_hist, occurrences, repeated, body_size)
+            occurrences = None
+
+        def page_lines():
+            for page_num in page_numbers:
+                with instrumentation.timed(instrumentation.EXTRACT_PARSE):
+                    records = _page_line_records(doc[page_num], page_num)
+                instrumentation.count(instrumentation.PAGES)
+                for record in records:
+                    if record[4] not in repeated or not _header_sized(record[2], body_size):
+                        yield record
+
+        if titles_by_page:
+            marked_lines = _outline_headings(page_lines(), titles_by_page)
+        else:
+            heading_threshold = _heading_threshold(font_hist, heading_rule)
+            if heading_threshold is None:
+                if cache is not None:
+                    cache.set(key, [])
+                return
+            marked_lines = _font_headings(page_lines(), heading_threshold)
+
+        seen = []
+        for section in _iter_sections(marked_lines):
+            if cache is not None:
+                seen.append(section)
+            if section.heading is not None:
+                yield section
+        if cache is not None:
+            cache.set(key, seen)
+    finally:
+        doc.close()
+
 if __name__ == "__main__":
     import argparse
     import sys
@@ -250,11 +812,25 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Quick test runner for pdf_extraction.extract_topics_from_pdf")
     parser.add_argument("pdf", nargs="?", help="Path to the PDF file to test")
     parser.add_argument("--write", action="store_true", help="Write output to a .txt file beside the script")
-    parser.add_argument("--fast", action="store_true", help="Use fast sampling mode for font-size stats (faster for large PDFs)")
-    parser.add_argument("--sample-pages", type=int, default=4, help="Number of pages to sample when --fast is used")
+    parser.add_argument("--fast", action="store_true", help="No effect: the font statistics always cover every page (kept for compatibility; sampling only applies to iter_topics_from_pdf)")
+    parser.add_argument("--sample-pages", type=int, default=4, help="No effect, like --fast (kept for compatibility)")
+    parser.add_argument("--workers", type=int, default=1, help="Parse the pages of the PDF in this many processes")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk extraction cache")
+    parser.add_argument("--clear-cache", action="store_true", help="Empty the on-disk extraction cache before running")
+    parser.add_argument("--heading-rule", choices=HEADING_RULES, default="stdev", help="How the heading font-size threshold is derived")
+    parser.add_argument("--pages", default=None, help='Only extract these pages, e.g. "3-5,9,20-" or an outline section name')
+    parser.add_argument("--outline", action="store_true", help="Use the PDF's bookmark outline for headings when present")
+    parser.add_argument("--keep-repeated", action="store_true", help="Keep running headers/footers repeated across pages")
     parser.add_argument("--post", action="store_true", help="Run post-processing (split into topics). Disabled by default to keep runs fast")
     args = parser.parse_args()
 
+    if args.clear_cache:
+        from cache import get_extraction_cache
+        get_extraction_cache().clear()
+        print("Extraction cache cleared")
+        if not args.pdf:
+            sys.exit(0)
+
     if not args.pdf:
         print("Usage: python pdf_extraction.py <path_to_pdf> [--write]")
         sys.exit(1)
@@ -263,7 +839,7 @@ if __name__ == "__main__":
         print(f"File not found: {args.pdf}")
         sys.exit(1)
 
-    result = extract_topics_from_pdf(args.pdf, write_to_file=args.write, fast=args.fast, sample_pages=args.sample_pages)
+    result = extract_topics_from_pdf(args.pdf, write_to_file=args.write, fast=args.fast, sample_pages=args.sample_pages, workers=args.workers, use_cache=not args.no_cache, strip_repeated=not args.keep_repeated, use_outline=args.outline, heading_rule=args.heading_rule, pages=args.pages)
     if isinstance(result, str):
         # Print a concise preview to verify output without flooding the console
         preview = result if len(result) <= 2000 else result[:2000] + "\n... (truncated)"
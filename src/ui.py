@@ -1,5 +1,6 @@
 import os
 import io
+import asyncio
 import zipfile
 from typing import List
 import tempfile
@@ -7,9 +8,48 @@ from pathlib import Path
 import gradio as gr
 
 # Import the same processing functions used in the Colab notebook
-from pdf_extraction import extract_topics_from_pdf
+from pdf_extraction import extract_sections_from_pdf
 from text_processing import split_into_topics
-from paraphrasing import paraphrase_chunks
+from cache import get_paraphrase_cache
+import instrumentation
+import metrics
+
+# When set, paraphrasing is delegated to a running paraphrase_server.py instead of a local model
+_SERVER_URL = os.environ.get("NOTES_SUMMARIZER_SERVER")
+# When set, Prometheus metrics are served on http://127.0.0.1:<port>/metrics
+_METRICS_PORT = os.environ.get("NOTES_SUMMARIZER_METRICS_PORT")
+
+
+async def paraphrase_topic_chunks(chunks, **kwargs):
+    """Paraphrase without blocking the event loop.
+
+    Locally, chunks go through coalescer.paraphrase_async (with the shared cache), so
+    concurrent users share generation batches; with a paraphrase server configured the
+    HTTP call runs in a thread and the server does the coalescing.
+    """
+    if _SERVER_URL:
+        from paraphrase_server import paraphrase_remote
+        return await asyncio.to_thread(paraphrase_remote, chunks, _SERVER_URL, **kwargs)
+    from coalescer import paraphrase_async
+    return await paraphrase_async(chunks, cache=get_paraphrase_cache(), **kwargs)
+
+
+async def _paraphrase_topics(topics, **kwargs):
+    """Paraphrase every topic concurrently; returns [(topic, bullets)] in topic order.
+
+    Submitting all topics at once lets the coalescer pack them into full batches.
+    A failing topic gets an error bullet instead of failing the whole document.
+    """
+    names = list(topics)
+    with instrumentation.timed(instrumentation.UI_PARAPHRASE):
+        results = await asyncio.gather(*(paraphrase_topic_chunks(topics[t], **kwargs) for t in names),
+                                       return_exceptions=True)
+    out = []
+    for topic, bullets in zip(names, results):
+        if isinstance(bullets, Exception):
+            bullets = [f'<<Error during paraphrasing topic "{topic}": {bullets}>>']
+        out.append((topic, bullets))
+    return out
 
 def load_text_from_uploaded(file) -> str:
     """Load text from a Gradio-uploaded file object or path.
@@ -102,9 +142,9 @@ def _make_data_url(path: str) -> tuple[str, str]:
     return data_url, filename
 
 
-def summarize_interface(uploaded_files, raw_text, selected_indices, max_length, min_length, num_return_sequences, temperature, num_beams, use_fp16):
-    """Generator that mirrors the Colab_Run workflow:
-    - For PDFs (when a filepath is available) use extract_topics_from_pdf
+async def summarize_interface(uploaded_files, raw_text, selected_indices, max_length, min_length, num_return_sequences, temperature, num_beams, use_fp16):
+    """Async generator that mirrors the Colab_Run workflow:
+    - For PDFs (when a filepath is available) use extract_sections_from_pdf
     - Split text into topics with split_into_topics
     - Paraphrase topic chunks with paraphrase_chunks
     Streams intermediate progress and returns a downloadable file (or zip).
@@ -141,14 +181,15 @@ def summarize_interface(uploaded_files, raw_text, selected_indices, max_length,
         except Exception:
             pass
 
-    # Warm the model (paraphrasing will also lazy-load if needed)
-    try:
-        # Importing load_model from the notebook code path if available; paraphrasing.get_model_tokenizer_device loads lazily
-        from config import get_model_tokenizer_device
-        get_model_tokenizer_device()
-    except Exception:
-        # ignore; paraphrase_chunks will call get_model_tokenizer_device when needed
-        pass
+    # Warm the model (paraphrasing will also lazy-load if needed); a paraphrase server keeps its own warm
+    if not _SERVER_URL:
+        try:
+            # Importing load_model from the notebook code path if available; paraphrasing.get_model_tokenizer_device loads lazily
+            from config import get_model_tokenizer_device
+            await asyncio.to_thread(get_model_tokenizer_device)
+        except Exception:
+            # ignore; paraphrase_chunks will call get_model_tokenizer_device when needed
+            pass
 
     summaries = []
     tmp_dir = tempfile.gettempdir()
@@ -166,8 +207,9 @@ def summarize_interface(uploaded_files, raw_text, selected_indices, max_length,
                 f, path = item
                 # Prefer to run the PDF extractor when a real file path to a PDF exists
                 if path and Path(path).suffix.lower() == '.pdf' and os.path.exists(path):
-                    extracted_text = extract_topics_from_pdf(path, fast=True, sample_pages=3)
-                    topics = split_into_topics(extracted_text)
+                    with instrumentation.timed(instrumentation.UI_EXTRACT):
+                        sections = await asyncio.to_thread(extract_sections_from_pdf, path)
+                    topics = split_into_topics(sections)
                 else:
                     # Fallback: read file content and split into topics
                     try:
@@ -178,20 +220,15 @@ def summarize_interface(uploaded_files, raw_text, selected_indices, max_length,
                     topics = split_into_topics(extracted_text)
 
             # Paraphrase chunks per-topic (preserve ordering)
+            # Build paraphrase kwargs from UI controls
+            paraphrase_kwargs = {
+                'batch_size': 16,
+                'num_beams': max(1, int(num_beams)),
+                'max_length': max(16, int(max_length)),
+                'do_sample': bool(temperature and float(temperature) > 0.1)
+            }
             out_text_parts = []
-            for topic, chunks in topics.items():
-                # Build paraphrase kwargs from UI controls
-                paraphrase_kwargs = {
-                    'batch_size': 16,
-                    'num_beams': max(1, int(num_beams)),
-                    'max_length': max(16, int(max_length)),
-                    'do_sample': bool(temperature and float(temperature) > 0.1)
-                }
-                try:
-                    bullets = paraphrase_chunks(chunks, **paraphrase_kwargs)
-                except Exception as e:
-                    bullets = [f'<<Error during paraphrasing topic "{topic}": {e}>>']
-
+            for topic, bullets in await _paraphrase_topics(topics, **paraphrase_kwargs):
                 out_text_parts.append(f"\n## {topic}\n")
                 out_text_parts.extend([f"• {b}" for b in bullets])
 
@@ -231,9 +268,27 @@ def summarize_interface(uploaded_files, raw_text, selected_indices, max_length,
 
 
 # Minimal Gradio UI wiring (re-creates the Blocks UI from the notebook)
-def launch_demo():
+def launch_demo(server_url=None, metrics_port=None):
+    """Launch the Gradio UI. server_url (or $NOTES_SUMMARIZER_SERVER) delegates paraphrasing to paraphrase_server.py.
+
+    metrics_port (or $NOTES_SUMMARIZER_METRICS_PORT) serves Prometheus metrics on localhost.
+    """
+    global _SERVER_URL
+    if server_url:
+        _SERVER_URL = server_url
+    metrics_port = metrics_port or _METRICS_PORT
+    if metrics_port:
+        from coalescer import get_backlog
+        metrics.register_coalescer(get_backlog)
+        metrics.start_metrics_server(port=int(metrics_port))
+        print(f'Metrics on http://127.0.0.1:{int(metrics_port)}/metrics')
+
     # Simple UI: upload a single PDF and press Summarize. Display the paraphrased output.
-    def summarize_pdf_simple(uploaded_file):
+    async def summarize_pdf_simple(uploaded_file):
+        with metrics.in_flight(), instrumentation.timed(instrumentation.UI_REQUEST):
+            return await _summarize_pdf_simple(uploaded_file)
+
+    async def _summarize_pdf_simple(uploaded_file):
         if not uploaded_file:
             return 'No file uploaded. Please upload a PDF file.'
 
@@ -241,7 +296,8 @@ def launch_demo():
         # If we have a real file path and it's a PDF, use the PDF extractor
         try:
             if path and Path(path).suffix.lower() == '.pdf' and os.path.exists(path):
-                extracted_text = extract_topics_from_pdf(path, fast=True, sample_pages=3)
+                with instrumentation.timed(instrumentation.UI_EXTRACT):
+                    extracted_text = await asyncio.to_thread(extract_sections_from_pdf, path)
             else:
                 # Fallback: try to read uploaded file content and treat as text
                 try:
@@ -254,12 +310,8 @@ def launch_demo():
 
             # Paraphrase each topic's chunks (use reasonable defaults)
             out = []
-            for topic, chunks in topics.items():
+            for topic, bullets in await _paraphrase_topics(topics, batch_size=16, num_beams=1, max_length=64, do_sample=True):
                 out.append(f"## {topic}\n")
-                try:
-                    bullets = paraphrase_chunks(chunks, batch_size=16, num_beams=1, max_length=64, do_sample=True)
-                except Exception as e:
-                    bullets = [f'<<Error paraphrasing topic "{topic}": {e}>>']
                 out.extend([f'• {b}' for b in bullets])
 
             result_text = '\n'.join(out).strip()
@@ -7,7 +7,7 @@ def summarize_pdf(pdf_filename, paraphrase=True, paraphrase_kwargs=None):
     # fast=True uses a small set of sampled pages to estimate font-size thresholds which speeds up large PDFs
     if paraphrase_kwargs is None:
         paraphrase_kwargs = {'batch_size': 16, 'num_beams': 1, 'max_length': 64, 'do_sample': True}
-    extracted_text = extract_topics_from_pdf(pdf_filename, fast=True, sample_pages=3)
+    extracted_text = extract_topics_from_pdf(pdf_filename)
     topics = split_into_topics(extracted_text)
 
     output_content = ""
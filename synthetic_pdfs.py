@@ -0,0 +1,88 @@
+import random
+
+import fitz
+
+# Deterministic filler text; the benchmarks only need realistic line lengths and font sizes
+_WORDS = ("the model learns a mapping from input features to output labels using gradient descent over many "
+          "epochs with careful regularisation and validation on held out data while tracking the loss").split()
+
+_PAGE_MARGIN = 50
+_HEADING_SIZE = 18
+_BODY_SIZE = 11
+_LINE_HEIGHT = 14
+
+
+def _sentence(rng, n_words):
+    words = [rng.choice(_WORDS) for _ in range(n_words)]
+    return " ".join(words).capitalize() + "."
+
+
+def _image_png(size_px=400):
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, size_px, size_px), False)
+    for y in range(0, size_px, 7):
+        for x in range(0, size_px, 7):
+            pix.set_pixel(x, y, ((x * 3) % 256, (y * 5) % 256, (x + y) % 256))
+    return pix.tobytes("png")
+
+
+def make_synthetic_pdf(path, pages=20, headings_per_page=2, paragraphs_per_section=2, bullets_per_section=3,
+                       columns=1, images_per_page=0, running_header=True, seed=0):
+    """Write a lecture-notes-like PDF to path and return path.
+
+    Every page gets headings_per_page sections (a large-font heading, body paragraphs
+    and bullet items) laid out in `columns` text columns, plus images_per_page images
+    and, if running_header is set, a repeated header and page-number footer. The
+    content depends only on the arguments, so runs are comparable across machines.
+    """
+    rng = random.Random(seed)
+    png = _image_png() if images_per_page else None
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page()
+        width, height = page.rect.width, page.rect.height
+        if running_header:
+            page.insert_text((_PAGE_MARGIN, 30), "Lecture Notes - Synthetic Benchmark", fontsize=9)
+            page.insert_text((width - _PAGE_MARGIN, height - 20), str(p + 1), fontsize=9)
+
+        # Images take the bottom of the page; text flows through the columns above them
+        text_bottom = height - _PAGE_MARGIN
+        if images_per_page:
+            image_h = 120
+            text_bottom -= image_h + 10
+            image_w = (width - 2 * _PAGE_MARGIN) / images_per_page
+            for i in range(images_per_page):
+                x0 = _PAGE_MARGIN + i * image_w
+                page.insert_image(fitz.Rect(x0, text_bottom + 10, x0 + image_w - 5, text_bottom + 10 + image_h),
+                                  stream=png)
+
+        col_w = (width - 2 * _PAGE_MARGIN) / columns
+        chars_per_line = max(20, int(col_w / (_BODY_SIZE * 0.5)))
+        col = 0
+        y = _PAGE_MARGIN + 10
+
+        def place(text, fontsize, indent=0):
+            nonlocal col, y
+            if y + fontsize > text_bottom:
+                if col + 1 >= columns:
+                    return
+                col += 1
+                y = _PAGE_MARGIN + 10
+            page.insert_text((_PAGE_MARGIN + col * col_w + indent, y), text, fontsize=fontsize)
+            y += fontsize + (_LINE_HEIGHT - _BODY_SIZE)
+
+        for s in range(headings_per_page):
+            place(f"Section {p + 1}.{s + 1} {rng.choice(_WORDS).title()} {rng.choice(_WORDS).title()}", _HEADING_SIZE)
+            for _ in range(paragraphs_per_section):
+                text = " ".join(_sentence(rng, rng.randint(8, 16)) for _ in range(3))
+                # Wrap to the column width so paragraphs span several lines like real notes
+                while text:
+                    cut = text.rfind(" ", 0, chars_per_line) if len(text) > chars_per_line else len(text)
+                    cut = cut if cut > 0 else len(text)
+                    place(text[:cut], _BODY_SIZE)
+                    text = text[cut:].lstrip()
+            for _ in range(bullets_per_section):
+                place("• " + _sentence(rng, rng.randint(5, 9)), _BODY_SIZE, indent=15)
+            y += 8
+    doc.save(path)
+    doc.close()
+    return path
@@ -1,41 +1,73 @@
 import re
+import hashlib
+import random
 from functools import lru_cache
 
+import instrumentation
+
 # Precompile regexes for better performance
 _TOPIC_HEADER_RE = re.compile(r'^<.*>$')
 _WHITESPACE_RE = re.compile(r'\s+')
 _DASH_RE = re.compile(r'\s*[-–]+\s*')
 
+# MinHash parameters for near-duplicate detection: 32 hashes in 8 LSH bands of 4 rows
+_MINHASH_PERM = 32
+_MINHASH_BANDS = 8
+_SHINGLE_SIZE = 5
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1234)
+_MINHASH_COEFFS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(_MINHASH_PERM)]
+del _rng
+
 # Defer heavy imports (nltk) until actually needed by functions
 @lru_cache(maxsize=1)
 def _get_sent_tokenize():
     from nltk.tokenize import sent_tokenize
     return sent_tokenize
 
+def _lines_to_sentences(buf):
+    if buf:
+        # Join lines into one block
+        block = " ".join(buf)
+        # Clean unwanted breaks/spaces using precompiled regex
+        block = _WHITESPACE_RE.sub(' ', block).strip()
+        # Replace dashes/bullets with colons for readability
+        block = _DASH_RE.sub(': ', block)
+        # Split into sentences (import lazily)
+        sent_tokenize = _get_sent_tokenize()
+        return sent_tokenize(block)
+    return []
+
 def split_into_topics(text):
+    """Split extracted content into {topic: [sentences]}.
+
+    Accepts either the <TOPIC> text produced by extract_topics_from_pdf or an
+    iterable of pdf_extraction.Section objects; the latter skips re-parsing.
+    """
+    with instrumentation.timed(instrumentation.SPLIT):
+        topics = _split_into_topics(text)
+    instrumentation.count(instrumentation.TOPICS, len(topics))
+    instrumentation.count(instrumentation.CHUNKS, sum(len(chunks) for chunks in topics.values()))
+    return topics
+
+
+def _split_into_topics(text):
+    if not isinstance(text, str):
+        topics = {}
+        for topic, sentences in iter_topic_chunks(text):
+            topics[topic] = sentences
+        return topics
+
     lines = text.split("\n")
     topics = {}
     current_topic = None
     buffer = []
 
-    def flush_buffer(topic, buf):
-        if buf:
-            # Join lines into one block
-            block = " ".join(buf)
-            # Clean unwanted breaks/spaces using precompiled regex
-            block = _WHITESPACE_RE.sub(' ', block).strip()
-            # Replace dashes/bullets with colons for readability
-            block = _DASH_RE.sub(': ', block)
-            # Split into sentences (import lazily)
-            sent_tokenize = _get_sent_tokenize()
-            return sent_tokenize(block)
-        return []
-
     for line in lines:
         line = line.strip()
         if _TOPIC_HEADER_RE.match(line):  # topic header
             if current_topic and buffer:
-                topics[current_topic].extend(flush_buffer(current_topic, buffer))
+                topics[current_topic].extend(_lines_to_sentences(buffer))
             topic_name = line.strip("<>").strip()
             current_topic = topic_name if topic_name else "Unnamed Topic"
             topics[current_topic] = []
@@ -45,10 +77,23 @@ def split_into_topics(text):
 
     # Flush last topic
     if current_topic and buffer:
-        topics[current_topic].extend(flush_buffer(current_topic, buffer))
+        topics[current_topic].extend(_lines_to_sentences(buffer))
 
     return topics
 
+def iter_topic_chunks(sections):
+    """Streaming counterpart of split_into_topics.
+
+    Takes pdf_extraction.Section objects (e.g. from iter_topics_from_pdf) and yields
+    (topic, sentences) one section at a time, so paraphrasing can start before the
+    whole document is parsed. Headingless sections are skipped, as in the text path.
+    """
+    for section in sections:
+        if section.heading is None:
+            continue
+        buffer = [ln.strip() for ln in section.body_lines() if ln.strip()]
+        yield section.topic, _lines_to_sentences(buffer)
+
 def merge_short_sentences(text, min_words=15):
     sent_tokenize = _get_sent_tokenize()
     sentences = sent_tokenize(text)
@@ -67,4 +112,63 @@ def merge_short_sentences(text, min_words=15):
             merged.append(sent)
     if buffer:
         merged.append(buffer.strip())
-    return merged
\ No newline at end of file
+    return merged
+
+
+def _normalize_chunk(chunk):
+    return _WHITESPACE_RE.sub(' ', chunk).strip().lower()
+
+def _shingles(text):
+    if len(text) <= _SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + _SHINGLE_SIZE] for i in range(len(text) - _SHINGLE_SIZE + 1)}
+
+def _minhash(shingles):
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little') for s in shingles]
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _MINHASH_COEFFS)
+
+def dedupe_chunks(chunks, near=False, threshold=0.85):
+    """Collapse duplicate chunks so each distinct one is generated only once.
+
+    Exact duplicates are matched after normalising whitespace and case. With near=True,
+    chunks whose character-shingle Jaccard similarity to an earlier chunk reaches
+    threshold are collapsed too; candidates come from MinHash LSH buckets and are
+    verified against the real Jaccard similarity.
+
+    Returns (unique_chunks, positions) where chunks[i] maps to unique_chunks[positions[i]].
+    """
+    unique = []
+    positions = []
+    seen = {}
+    shingle_sets = []
+    buckets = {}
+    rows = _MINHASH_PERM // _MINHASH_BANDS
+    for chunk in chunks:
+        norm = _normalize_chunk(chunk)
+        if norm in seen:
+            positions.append(seen[norm])
+            continue
+        match = None
+        if near:
+            shingles = _shingles(norm)
+            signature = _minhash(shingles)
+            bands = [(b, signature[b * rows:(b + 1) * rows]) for b in range(_MINHASH_BANDS)]
+            candidates = {u for band in bands for u in buckets.get(band, ())}
+            for u in sorted(candidates):
+                other = shingle_sets[u]
+                if len(shingles & other) / len(shingles | other) >= threshold:
+                    match = u
+                    break
+        if match is not None:
+            seen[norm] = match
+            positions.append(match)
+            continue
+        idx = len(unique)
+        unique.append(chunk)
+        seen[norm] = idx
+        positions.append(idx)
+        if near:
+            shingle_sets.append(shingles)
+            for band in bands:
+                buckets.setdefault(band, []).append(idx)
+    return unique, positions
@@ -0,0 +1,69 @@
+import torch
+from transformers import T5Config, T5ForConditionalGeneration
+
+# Small enough to build in well under a second on CPU, large enough that batching,
+# padding and beam search behave like the real model (same T5 architecture)
+TINY_T5_CONFIG = {
+    "d_model": 64,
+    "d_ff": 256,
+    "d_kv": 16,
+    "num_layers": 2,
+    "num_decoder_layers": 2,
+    "num_heads": 4,
+}
+_TINY_SEED = 0
+_FALLBACK_VOCAB_SIZE = 2000
+
+# Training text for the fallback tokenizer; only realistic token lengths matter
+_FALLBACK_CORPUS = (
+    "paraphrase: the model learns a mapping from input features to output labels using gradient descent. "
+    "Lecture notes cover regularisation, validation, overfitting, neural networks and loss functions. "
+    "Each section of the slides introduces a definition, an example and a short summary of the key ideas. "
+    "Students should review the derivation, compare the algorithms and practise with the exercises. "
+    "The quick brown fox jumps over the lazy dog while 0123456789 numbers and punctuation appear, too!"
+)
+
+
+def _fallback_tokenizer():
+    """Byte-level BPE tokenizer trained in memory; used when the real tokenizer is not cached locally."""
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast
+
+    tok = Tokenizer(models.BPE(unk_token="<unk>"))
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(vocab_size=_FALLBACK_VOCAB_SIZE, special_tokens=["<pad>", "</s>", "<unk>"],
+                                  initial_alphabet=pre_tokenizers.ByteLevel.alphabet(), show_progress=False)
+    tok.train_from_iterator([_FALLBACK_CORPUS] * 50, trainer)
+    return PreTrainedTokenizerFast(tokenizer_object=tok, pad_token="<pad>", eos_token="</s>", unk_token="<unk>")
+
+
+def load_tiny_tokenizer(model_name):
+    """The real tokenizer of model_name if it is in the local Hugging Face cache, else an offline BPE stand-in.
+
+    Never touches the network.
+    """
+    from transformers import AutoTokenizer
+    try:
+        return AutoTokenizer.from_pretrained(model_name, local_files_only=True)
+    except Exception:
+        return _fallback_tokenizer()
+
+
+def build_tiny_model(tokenizer, device=None):
+    """A small randomly initialised T5ForConditionalGeneration whose vocabulary matches tokenizer.
+
+    Weights are seeded, so outputs are reproducible (and meaningless); the point is to
+    exercise tokenization, batching, generation and caching with realistic shapes offline.
+    """
+    config = T5Config(vocab_size=len(tokenizer), pad_token_id=tokenizer.pad_token_id,
+                      eos_token_id=tokenizer.eos_token_id, decoder_start_token_id=tokenizer.pad_token_id,
+                      **TINY_T5_CONFIG)
+    # Seed a private generator state so building the model does not disturb the caller's RNG
+    with torch.random.fork_rng(devices=[]):
+        torch.manual_seed(_TINY_SEED)
+        model = T5ForConditionalGeneration(config)
+    if device is not None:
+        model = model.to(device)
+    model.eval()
+    return model